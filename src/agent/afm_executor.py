@@ -1,30 +1,124 @@
+import asyncio
 import logging
-from typing import List, Dict, Any
+import re
+from typing import Any, Dict, List, Tuple
+from groq import BadRequestError
 from sqlalchemy.orm import Session
+from langchain_core.exceptions import OutputParserException
 from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
+from langchain_core.prompts import ChatPromptTemplate
 from langchain_groq import ChatGroq
 from langgraph.store.redis import RedisStore
 from pydantic import ValidationError
 
-from .afm_prompt_template import MASTER_PROMPT_TEMPLATE
-from .tools import execute_tool
+from .afm_prompt_template import MASTER_SYSTEM_PROMPT, USER_CONTEXT_TEMPLATE
+from .tools import batched_store_writes, execute_tool
+from .tool_parser import TOOL_SCHEMAS, parse_tool_call
 from .tool_schemas import SaveGrammarCorrection, UpdateUserProfile, WebSearch
 
 # Modelo principal do AFM
 llm = ChatGroq(model="llama-3.3-70b-versatile", temperature=0.3)
 
-# Modelo para structured outputs
-structured_llm = ChatGroq(model="llama-3.3-70b-versatile", temperature=0.0)
+# Modelo para structured outputs: extração guiada por schema não precisa do modelo de 70B
+structured_llm = ChatGroq(model="llama-3.1-8b-instant", temperature=0.0)
 
-# Bind schemas usando with_structured_output
-websearch_extractor = structured_llm.with_structured_output(WebSearch)
-profile_extractor = structured_llm.with_structured_output(UpdateUserProfile)
-grammar_extractor = structured_llm.with_structured_output(SaveGrammarCorrection)
+# Modelo maior usado só quando a saída do modelo pequeno não valida
+structured_llm_fallback = ChatGroq(model="llama-3.3-70b-versatile", temperature=0.0)
+
+
+def _create_extractor(schema):
+    """Bind do schema usando with_structured_output, com fallback para o modelo maior."""
+    return structured_llm.with_structured_output(schema).with_fallbacks(
+        [structured_llm_fallback.with_structured_output(schema)],
+        exceptions_to_handle=(ValidationError, OutputParserException, BadRequestError),
+    )
+
+websearch_extractor = _create_extractor(WebSearch)
+profile_extractor = _create_extractor(UpdateUserProfile)
+grammar_extractor = _create_extractor(SaveGrammarCorrection)
+
+_EXTRACTOR_MAP = {
+    "WebSearch": websearch_extractor,
+    "UpdateUserProfile": profile_extractor,
+    "SaveGrammarCorrection": grammar_extractor,
+}
+
+# Fixed system prefix shared by every extraction call, only the tool call itself changes
+_EXTRACT_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", "Extract the parameters from the function call sent by the user and return them in the correct schema format. Parse the function call and extract all parameters."),
+    ("human", "{call}"),
+])
+
+# Limite de tempo de cada chamada ao LLM principal e de turnos com chamadas de ferramenta inválidas
+AFM_LLM_TIMEOUT_SECONDS = 8.0
+MAX_TOOL_PARSE_FAILURES = 2
+FALLBACK_ANSWER = "I'm sorry, I couldn't process your request after several attempts."
+
+_FINAL_ANSWER_RE = re.compile(r"<final_answer>(.*?)(?:</final_answer>|$)", re.DOTALL)
+# Every <tool_call> in a response, whether alone or grouped inside a <tool_calls> block.
+# A call left unterminated at the end of the output is still picked up.
+_TOOL_CALL_RE = re.compile(r"<tool_call>(.*?)(?:</tool_call>|$)", re.DOTALL)
+# Finds which tool a call refers to when it could not be parsed locally
+_TOOL_NAME_RE = re.compile(r"\b(" + "|".join(TOOL_SCHEMAS) + r")\b")
+
+
+async def _run_tool_call(
+    tool_call_content: str,
+    store: RedisStore,
+    user_id: str,
+    conversation_id: str,
+    db_session: Session
+) -> Tuple[str, bool]:
+    """
+    Parses and executes a single tool call.
+
+    Returns the text for the observation and whether the call could be parsed at all.
+    """
+    parsed = False
+    try:
+        logging.debug("Processing tool call: %s", tool_call_content)
+        
+        try:
+            # The AFM already writes `ToolName(args)`, so parse it locally and skip an LLM round-trip
+            tool_name, tool_params_obj = parse_tool_call(tool_call_content)
+        except (SyntaxError, ValueError) as e:
+            logging.warning(f"Local tool call parsing failed ({e}). Falling back to structured output.")
+            
+            name_match = _TOOL_NAME_RE.search(tool_call_content)
+            if not name_match:
+                raise ValueError(f"Tool not recognized in: {tool_call_content}") # Traduzido
+            
+            tool_name = name_match.group(1)
+            extractor = _EXTRACTOR_MAP[tool_name]
+            
+            logging.debug("Using structured output to extract the parameters of %s", tool_name)
+            
+            tool_params_obj = await extractor.ainvoke(_EXTRACT_PROMPT.format_messages(call=tool_call_content))
+        
+        parsed = True
+        logging.info(f"AFM Tool Call: {tool_name}")
+        logging.debug("Extracted tool parameters: %s", tool_params_obj)
+        
+        tool_params = tool_params_obj.model_dump()
+        tool_params['user_id'] = user_id
+        tool_params['store'] = store
+        tool_params['db_session'] = db_session
+        tool_params['conversation_id'] = conversation_id
+        
+        return await execute_tool(tool_name, tool_params), parsed
+
+    except ValidationError as e:
+        logging.error(f"Pydantic validation error: {e}", exc_info=True)
+        return f"Pydantic validation error: {e}", parsed
+        
+    except Exception as e:
+        logging.error(f"Failed to execute tool call: {e}", exc_info=True)
+        return f"Error executing tool: {e}", parsed
 
 
 async def run_afm_cycle(
     user_input: str,
-    conversation_history: list,
+    history: str,
     user_profile: str,
     syntactic_analysis: str,
     semantic_analysis: str,
@@ -33,92 +127,73 @@ async def run_afm_cycle(
     conversation_id: str,
     db_session: Session
 ) -> str:
-    history_str = "\n".join([f"{msg['role']}: {msg['content']}" for msg in conversation_history])
-    
-    prompt = MASTER_PROMPT_TEMPLATE.format(
+    """
+    Executa o ciclo de raciocínio do AFM.
+
+    `history` é o histórico já formatado (veja history_buffer.render_history).
+    """
+    context = USER_CONTEXT_TEMPLATE.format(
         syntactic_analysis=syntactic_analysis,
         semantic_analysis=semantic_analysis,
-        history=history_str,
+        history=history,
         user_profile=user_profile,
         user_input=user_input,
         conversation_id=conversation_id
     )
     
-    messages = [SystemMessage(content=prompt)]
+    messages = [SystemMessage(content=MASTER_SYSTEM_PROMPT), HumanMessage(content=context)]
+    
+    tool_parse_failures = 0
     
     max_turns = 5
     for turn in range(max_turns):
         logging.info(f"AFM Turn {turn + 1}/{max_turns}")
         
-        response_ai = llm.invoke(messages)
+        try:
+            response_ai = await asyncio.wait_for(llm.ainvoke(messages), timeout=AFM_LLM_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            logging.warning(f"AFM LLM call timed out after {AFM_LLM_TIMEOUT_SECONDS}s on turn {turn + 1}.")
+            return FALLBACK_ANSWER
         response_content = response_ai.content
         
-        print("\n" + "="*20 + f" SAÍDA DO LLM (Turno {turn + 1}) " + "="*20)
-        print(response_content)
-        print("="*65 + "\n")
+        logging.debug("AFM LLM output (turn %d): %s", turn + 1, response_content)
         
         messages.append(AIMessage(content=response_content))
 
-        if "<final_answer>" in response_content:
-            final_answer = response_content.split("<final_answer>")[1].split("</final_answer>")[0].strip()
+        final_match = _FINAL_ANSWER_RE.search(response_content)
+        tool_calls = [call.strip() for call in _TOOL_CALL_RE.findall(response_content)]
+        
+        if final_match:
             # Retorna apenas a resposta final, sem as outras tags (plan, reflection).
-            return final_answer
+            return final_match.group(1).strip()
         
-        if "<tool_call>" in response_content:
-            tool_call_content = response_content.split("<tool_call>")[1].split("</tool_call>")[0].strip()
+        if tool_calls:
+            # Independent tool calls from the same turn (e.g. profile + grammar) run concurrently
+            # and their Redis writes go out together once the turn is committed
+            async with batched_store_writes(store, db_session):
+                outcomes = await asyncio.gather(*(
+                    _run_tool_call(call, store, user_id, conversation_id, db_session)
+                    for call in tool_calls
+                ))
+            tool_results = [result for result, _ in outcomes]
+            
+            # Um modelo que insiste em chamadas que não podem ser interpretadas não vai convergir
+            if not any(parsed for _, parsed in outcomes):
+                tool_parse_failures += 1
+                if tool_parse_failures >= MAX_TOOL_PARSE_FAILURES:
+                    logging.warning("AFM kept producing tool calls that could not be parsed. Stopping early.")
+                    return FALLBACK_ANSWER
+            
+            if len(tool_calls) == 1:
+                observation = tool_results[0]
+            else:
+                observation = "\n\n".join(
+                    f"{call}\n-> {result}" for call, result in zip(tool_calls, tool_results)
+                )
             
-            try:
-                print(f"[...Processando chamada de ferramenta: '{tool_call_content}']")
-                
-                extractor = None
-                tool_name = None
-                
-                if "WebSearch" in tool_call_content:
-                    extractor = websearch_extractor
-                    tool_name = "WebSearch"
-                elif "UpdateUserProfile" in tool_call_content:
-                    extractor = profile_extractor
-                    tool_name = "UpdateUserProfile"
-                elif "SaveGrammarCorrection" in tool_call_content:
-                    extractor = grammar_extractor
-                    tool_name = "SaveGrammarCorrection"
-                else:
-                    raise ValueError(f"Tool not recognized in: {tool_call_content}") # Traduzido
-                
-                logging.info(f"AFM Tool Call: {tool_name}")
-                print(f"[...Usando structured output para extrair parâmetros de {tool_name}...]")
-                
-                extraction_prompt = f"""Extract the parameters from this function call and return them in the correct schema format:
-
-{tool_call_content}
-
-Parse the function call and extract all parameters."""
-                
-                tool_params_obj = extractor.invoke([HumanMessage(content=extraction_prompt)])
-                print(f"[...Objeto Pydantic extraído: {tool_params_obj}]")
-                
-                tool_params = tool_params_obj.model_dump()
-                tool_params['user_id'] = user_id
-                tool_params['store'] = store
-                tool_params['db_session'] = db_session
-                tool_params['conversation_id'] = conversation_id
-                
-                tool_result = await execute_tool(tool_name, tool_params)
-                
-                observation_message = HumanMessage(content=f"<observation>\n{tool_result}\n</observation>")
-                messages.append(observation_message)
-
-            except ValidationError as e:
-                logging.error(f"Pydantic validation error: {e}", exc_info=True)
-                error_message = HumanMessage(content=f"<observation>\nPydantic validation error: {e}\n</observation>")
-                messages.append(error_message)
-                
-            except Exception as e:
-                logging.error(f"Failed to execute tool call: {e}", exc_info=True)
-                error_message = HumanMessage(content=f"<observation>\nError executing tool: {e}\n</observation>")
-                messages.append(error_message)
+            messages.append(HumanMessage(content=f"<observation>\n{observation}\n</observation>"))
         else:
             logging.warning("AFM did not produce a final answer or a tool call. Returning last raw content.")
             return response_content.strip()
 
-    return "I'm sorry, I couldn't process your request after several attempts."
\ No newline at end of file
+    return FALLBACK_ANSWER
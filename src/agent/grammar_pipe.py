@@ -1,3 +1,5 @@
+import logging
+import re
 from typing import TypedDict, Annotated
 from langgraph.graph import StateGraph, START, END
 from langchain_groq import ChatGroq
@@ -9,59 +11,96 @@ class PreprocessingState(TypedDict):
     syntactic_analysis: str
     semantic_analysis: str
 
+NO_SYNTAX_ERRORS = "Nenhum erro de sintaxe encontrado."
+NO_SEMANTIC_ERRORS = "No additional semantic errors found."
+
+# Frases com menos palavras que isso só passam pelo LLM se o LanguageTool encontrar erros
+SHORT_INPUT_WORDS = 6
+# Respostas curtas e comuns que não têm o que corrigir semanticamente
+_FILLER_RE = re.compile(
+    r"^\s*(yes|yeah|yep|no|nope|ok|okay|sure|thanks?|thank you|hi|hello|hey|bye|goodbye)[\s.!?,]*$",
+    re.IGNORECASE,
+)
+
 language_tool = LanguageToolAPI()
-semantic_llm = ChatGroq(model="llama-3.3-70b-versatile", temperature=0.1)
+# A análise semântica de uma única frase é bem mais simples que o raciocínio do AFM
+semantic_llm = ChatGroq(model="llama-3.1-8b-instant", temperature=0.1)
 
 
-def syntactic_check_node(state: PreprocessingState) -> PreprocessingState:
-    """Primeiro nó: Roda a análise sintática com LanguageTool."""
-    print("[Pipeline LangGraph]: Executando Nó de Análise Sintática...")
+async def syntactic_check_node(state: PreprocessingState) -> PreprocessingState:
+    """Roda a análise sintática com LanguageTool, em paralelo com a análise semântica."""
+    logging.debug("[Pipeline LangGraph]: Executando Nó de Análise Sintática...")
     user_input = state['user_input']
-    correction_result = language_tool.check_text(user_input)
+    correction_result = await language_tool.acheck_text(user_input)
     
     analysis_str = ""
     if correction_result.errors:
         analysis_str = f"Foram encontrados erros. Texto original: '{correction_result.original_text}'. Correção sugerida: '{correction_result.corrected_text}'. Explicação: {correction_result.explanation}"
     else:
-        analysis_str = "Nenhum erro de sintaxe encontrado."
+        analysis_str = NO_SYNTAX_ERRORS
         
     return {"syntactic_analysis": analysis_str}
 
-def semantic_check_node(state: PreprocessingState) -> PreprocessingState:
-    """Segundo nó: Roda a análise semântica com um LLM especialista."""
-    print("[Pipeline LangGraph]: Executando Nó de Análise Semântica...")
+def _is_short(user_input: str) -> bool:
+    return len(user_input.split()) < SHORT_INPUT_WORDS
+
+async def semantic_check_node(state: PreprocessingState) -> PreprocessingState:
+    """Roda a análise semântica com um LLM especialista, sem depender da análise sintática."""
+    logging.debug("[Pipeline LangGraph]: Executando Nó de Análise Semântica...")
     user_input = state['user_input']
-    syntactic_analysis = state['syntactic_analysis']
+
+    # Dispensa o LLM para respostas triviais e frases curtas sem erros de sintaxe
+    if _FILLER_RE.match(user_input) or (
+        _is_short(user_input) and state.get('syntactic_analysis') == NO_SYNTAX_ERRORS
+    ):
+        return {"semantic_analysis": NO_SEMANTIC_ERRORS}
 
     prompt = f"""
     You are an expert in English linguistics, focusing on semantics and natural language use for voice conversations.
     Your task is to analyze a sentence from an English learner and find errors that an automatic syntax tool might miss.
+    A separate tool already checks spelling and basic grammar, so focus on meaning and natural usage.
     You MUST IGNORE all punctuation errors. The input comes from a voice-to-text system where punctuation is not relevant.
 
     User's Sentence: "{user_input}"
 
-    Analysis from the Syntactic Tool:
-    "{syntactic_analysis}"
-
     Your Analysis:
     1.  Review the user's sentence.
     2.  Are there any semantic errors, incorrect word choices (e.g., 'their' vs 'there'), or phrases that sound unnatural, even if grammatically correct?
     3.  Provide a clear and concise explanation for each semantic or usage error you find.
-    4.  If no additional semantic errors are found, respond ONLY with "No additional semantic errors found.".
+    4.  If no additional semantic errors are found, respond ONLY with "{NO_SEMANTIC_ERRORS}".
     """
     
-    response = semantic_llm.invoke(prompt)
+    response = await semantic_llm.ainvoke(prompt)
     return {"semantic_analysis": response.content}
 
+def route_from_start(state: PreprocessingState) -> list[str]:
+    """Frases curtas esperam a análise sintática; as demais rodam as duas análises em paralelo."""
+    if _is_short(state['user_input']):
+        return ["syntactic_check"]
+    return ["syntactic_check", "semantic_check"]
+
+def route_after_syntactic(state: PreprocessingState) -> str:
+    """Encadeia a análise semântica depois da sintática apenas para frases curtas."""
+    if _is_short(state['user_input']):
+        return "semantic_check"
+    return END
+
 def create_preprocessing_graph():
-    """Cria e compila o grafo LangGraph para o pipeline de pré-processamento."""
+    """
+    Cria e compila o grafo LangGraph para o pipeline de pré-processamento.
+
+    As análises sintática e semântica são independentes, então os dois nós partem
+    do START em paralelo e o grafo só termina quando ambos escrevem no estado.
+    Frases curtas são a exceção: a análise semântica roda depois da sintática para
+    poder ser dispensada quando o LanguageTool não encontra erros.
+    """
     workflow = StateGraph(PreprocessingState)
 
     workflow.add_node("syntactic_check", syntactic_check_node)
     workflow.add_node("semantic_check", semantic_check_node)
 
-    workflow.add_edge(START, "syntactic_check")
-    workflow.add_edge("syntactic_check", "semantic_check")
+    workflow.add_conditional_edges(START, route_from_start, ["syntactic_check", "semantic_check"])
+    workflow.add_conditional_edges("syntactic_check", route_after_syntactic, ["semantic_check", END])
     workflow.add_edge("semantic_check", END)
     
-    return workflow.compile()
\ No newline at end of file
+    return workflow.compile()
@@ -0,0 +1,127 @@
+import asyncio
+import logging
+import threading
+from typing import Callable, List, Optional
+from langchain_groq import ChatGroq
+from langgraph.store.base import GetOp, Item
+from langgraph.store.redis import RedisStore
+
+# Above this size (in characters) the older messages are folded into a running summary
+HISTORY_CHAR_BUDGET = 6000
+# Number of most recent messages that are always kept verbatim
+HISTORY_KEEP_RECENT = 8
+# The cache expires after a week without new turns (RedisStore TTLs are in minutes); an
+# expired conversation is simply reloaded from the database on its next turn
+HISTORY_TTL_MINUTES = 7 * 24 * 60
+
+# append_history is a read-modify-write of the whole buffer. Appends to the same conversation
+# are serialized in-process (the app runs a single worker), striped to keep the lock set bounded.
+_APPEND_LOCKS = [threading.Lock() for _ in range(64)]
+
+# Summarization is a simple task, a small model is enough
+summary_llm = ChatGroq(model="llama-3.1-8b-instant", temperature=0.0)
+
+SUMMARY_PROMPT = """
+You maintain the memory of a conversation between an English learner (human) and their tutor (ai).
+Update the running summary with the new lines of conversation and return ONLY the new summary.
+Keep facts about the learner (name, interests, plans), the topics discussed and the grammar points
+that were corrected. Be concise and do not invent anything.
+
+Current summary:
+{summary}
+
+New lines of conversation:
+{lines}
+"""
+
+
+def _namespace(conversation_id: str) -> tuple:
+    return ("history", conversation_id)
+
+def _render(summary: str, recent: List[str]) -> str:
+    if summary:
+        return f"Summary of the earlier conversation: {summary}\n" + "\n".join(recent)
+    return "\n".join(recent)
+
+async def _summarize(summary: str, lines: List[str]) -> str | None:
+    """Folds the given lines into the running summary. Returns None if the LLM call fails."""
+    try:
+        response = await summary_llm.ainvoke(
+            SUMMARY_PROMPT.format(summary=summary or "(empty)", lines="\n".join(lines))
+        )
+        return response.content.strip()
+    except Exception as e:
+        logging.error(f"Failed to summarize conversation history: {e}", exc_info=True)
+        return None
+
+def _line(message: dict) -> str:
+    return f"{message['role']}: {message['content']}"
+
+def buffer_get_op(conversation_id: str) -> GetOp:
+    """Store read of the cached history, for callers that batch it with other reads."""
+    return GetOp(_namespace(conversation_id), "buffer")
+
+async def render_history(
+    store: RedisStore,
+    conversation_id: str,
+    item: Optional[Item],
+    load_history: Callable[[], list]
+) -> str:
+    """
+    Returns the conversation history formatted for the AFM prompt.
+
+    `item` is the result of buffer_get_op, read by the caller together with its other store
+    reads. The formatted history is kept in Redis and each finished turn is appended to it with
+    append_history, so the messages don't have to be reloaded from the database every turn.
+    `load_history` is only called when there is no cached history yet; it must return the
+    previous messages as dicts with `role` and `content`. When the history grows past
+    HISTORY_CHAR_BUDGET, everything but the last HISTORY_KEEP_RECENT messages is compressed
+    into a summary so the prompt stays bounded.
+    """
+    namespace = _namespace(conversation_id)
+    if item:
+        summary, recent = item.value["summary"], item.value["recent"]
+        changed = False
+    else:
+        # load_history queries the database through a sync session, keep it off the event loop
+        summary, recent = "", [_line(msg) for msg in await asyncio.to_thread(load_history)]
+        changed = True
+
+    size = len(summary) + sum(len(line) for line in recent)
+    if size > HISTORY_CHAR_BUDGET and len(recent) > HISTORY_KEEP_RECENT:
+        new_summary = await _summarize(summary, recent[:-HISTORY_KEEP_RECENT])
+        if new_summary is not None:
+            summary = new_summary
+            recent = recent[-HISTORY_KEEP_RECENT:]
+            changed = True
+
+    if changed:
+        # Not under the append lock, the summary call is too slow to hold it: a turn appended
+        # while it runs is lost from the cache (last writer wins). That is accepted, the cache
+        # only shortens the history the tutor sees and the database keeps every message.
+        await asyncio.to_thread(
+            store.put, namespace, "buffer", {"summary": summary, "recent": recent}, ttl=HISTORY_TTL_MINUTES
+        )
+    return _render(summary, recent)
+
+def append_history(store: RedisStore, conversation_id: str, messages: list) -> None:
+    """
+    Appends the messages of a finished turn to the cached history.
+
+    Does nothing when there is no cached history: the next call to render_history
+    loads it from the database, where these messages already are.
+    """
+    namespace = _namespace(conversation_id)
+    with _APPEND_LOCKS[hash(conversation_id) % len(_APPEND_LOCKS)]:
+        item = store.get(namespace, "buffer")
+        if not item:
+            return
+        buffer = item.value
+        store.put(namespace, "buffer", {
+            "summary": buffer["summary"],
+            "recent": buffer["recent"] + [_line(msg) for msg in messages],
+        }, ttl=HISTORY_TTL_MINUTES)
+
+def clear_history(store: RedisStore, conversation_id: str) -> None:
+    """Removes the cached history of a conversation."""
+    store.delete(_namespace(conversation_id), "buffer")
@@ -1,5 +1,9 @@
-import requests
+import asyncio
+import logging
+import hashlib
+import httpx
 from typing import List, Optional
+from cachetools import TTLCache
 from pydantic import BaseModel
 from datetime import datetime
 
@@ -22,6 +26,16 @@ class LanguageToolCorrection(BaseModel):
     explanation: str
     timestamp: datetime
 
+# Voice transcripts repeat short phrases a lot, so successful checks are cached per (language, text)
+_cache: TTLCache = TTLCache(maxsize=4096, ttl=3600)
+# In-flight async checks, so concurrent requests for the same text share one HTTP call
+_pending: dict = {}
+
+
+def _cache_key(text: str, language: str) -> tuple[str, bytes]:
+    return (language, hashlib.blake2b(text.encode(), digest_size=16).digest())
+
+
 class LanguageToolAPI:
     """Client for LanguageTool API"""
     
@@ -36,10 +50,67 @@ class LanguageToolAPI:
         """
         self.base_url = base_url
         self.check_url = f"{base_url}/check"
+        # Pooled clients reused across requests so concurrent checks share keep-alive connections.
+        # Created on first use and dropped by aclose(), so every app lifespan gets open clients.
+        self._client: Optional[httpx.AsyncClient] = None
+        self._sync_client: Optional[httpx.Client] = None
+    
+    def _async_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
+                timeout=10,
+            )
+        return self._client
+    
+    async def acheck_text(self, text: str, language: str = "en-US", api_key: Optional[str] = None) -> LanguageToolCorrection:
+        """
+        Check text for grammar errors using LanguageTool API without blocking the event loop
+        
+        Args:
+            text: Text to check
+            language: Language code (e.g., 'en-US', 'pt-BR')
+            api_key: API key for premium features (optional)
+            
+        Returns:
+            LanguageToolCorrection object with errors and corrections
+        """
+        key = _cache_key(text, language)
+        cached = _cache.get(key)
+        if cached is not None:
+            return cached
+        
+        pending = _pending.get(key)
+        if pending is None:
+            pending = asyncio.ensure_future(self._fetch(key, text, language, api_key))
+            _pending[key] = pending
+            pending.add_done_callback(lambda _: _pending.pop(key, None))
+        
+        # Shielded so a cancelled request doesn't cancel the check other requests are waiting on
+        return await asyncio.shield(pending)
+    
+    async def _fetch(self, key: tuple[str, bytes], text: str, language: str, api_key: Optional[str]) -> LanguageToolCorrection:
+        """POST the text to LanguageTool and cache the correction on success"""
+        data, headers = self._build_request(text, language, api_key)
+        
+        try:
+            response = await self._async_client().post("/check", data=data, headers=headers)
+            response.raise_for_status()
+            correction = self._parse_response(text, response.json())
+            _cache[key] = correction
+            return correction
+            
+        except httpx.HTTPError as e:
+            logging.error("Error calling LanguageTool API: %s", e)
+            return self._unavailable(text)
+        except Exception as e:
+            logging.error("Unexpected error in LanguageTool: %s", e)
+            return self._unavailable(text)
     
     def check_text(self, text: str, language: str = "en-US", api_key: Optional[str] = None) -> LanguageToolCorrection:
         """
-        Check text for grammar errors using LanguageTool API
+        Blocking variant of acheck_text, kept for callers outside the event loop
         
         Args:
             text: Text to check
@@ -49,7 +120,41 @@ class LanguageToolAPI:
         Returns:
             LanguageToolCorrection object with errors and corrections
         """
+        key = _cache_key(text, language)
+        cached = _cache.get(key)
+        if cached is not None:
+            return cached
+        
+        if self._sync_client is None:
+            self._sync_client = httpx.Client(base_url=self.base_url, timeout=10)
         
+        data, headers = self._build_request(text, language, api_key)
+        
+        try:
+            response = self._sync_client.post("/check", data=data, headers=headers)
+            response.raise_for_status()
+            correction = self._parse_response(text, response.json())
+            _cache[key] = correction
+            return correction
+            
+        except httpx.HTTPError as e:
+            logging.error("Error calling LanguageTool API: %s", e)
+            return self._unavailable(text)
+        except Exception as e:
+            logging.error("Unexpected error in LanguageTool: %s", e)
+            return self._unavailable(text)
+    
+    async def aclose(self) -> None:
+        """Close the pooled HTTP connections. The next check creates new clients."""
+        client, self._client = self._client, None
+        sync_client, self._sync_client = self._sync_client, None
+        if client is not None:
+            await client.aclose()
+        if sync_client is not None:
+            sync_client.close()
+    
+    def _build_request(self, text: str, language: str, api_key: Optional[str]) -> tuple[dict, dict]:
+        """Build the form data and headers for a /check request"""
         data = {
             'text': text,
             'language': language,
@@ -60,63 +165,58 @@ class LanguageToolAPI:
         if api_key:
             headers['Authorization'] = f'Bearer {api_key}'
         
-        try:
-            response = requests.post(self.check_url, data=data, headers=headers, timeout=10)
-            response.raise_for_status()
-            
-            result = response.json()
-            
-            errors = []
-            corrected_text = text
-            
-            matches = sorted(result.get('matches', []), key=lambda x: x['offset'], reverse=True)
-            
-            for match in matches:
-                error = GrammarError(
-                    message=match.get('message', ''),
-                    short_message=match.get('shortMessage', ''),
-                    offset=match['offset'],
-                    length=match['length'],
-                    rule_id=match.get('rule', {}).get('id', ''),
-                    category=match.get('rule', {}).get('category', {}).get('name', ''),
-                    replacements=[r['value'] for r in match.get('replacements', [])],
-                    context=match.get('context', {}).get('text', '')
-                )
-                errors.append(error)
-                
-                if error.replacements:
-                    start = error.offset
-                    end = error.offset + error.length
-                    corrected_text = corrected_text[:start] + error.replacements[0] + corrected_text[end:]
-            
-            explanation = self._create_explanation(errors)
-            
-            return LanguageToolCorrection(
-                original_text=text,
-                corrected_text=corrected_text,
-                errors=errors,
-                explanation=explanation,
-                timestamp=datetime.now()
+        return data, headers
+    
+    def _parse_response(self, text: str, result: dict) -> LanguageToolCorrection:
+        """Turn a LanguageTool JSON response into a LanguageToolCorrection"""
+        errors = []
+        parts = []
+        cursor = 0
+        
+        # Walk the matches once in text order and stitch the corrected text from slices
+        matches = sorted(result.get('matches', []), key=lambda x: x['offset'])
+        
+        for match in matches:
+            error = GrammarError(
+                message=match.get('message', ''),
+                short_message=match.get('shortMessage', ''),
+                offset=match['offset'],
+                length=match['length'],
+                rule_id=match.get('rule', {}).get('id', ''),
+                category=match.get('rule', {}).get('category', {}).get('name', ''),
+                replacements=[r['value'] for r in match.get('replacements', [])],
+                context=match.get('context', {}).get('text', '')
             )
+            errors.append(error)
             
-        except requests.exceptions.RequestException as e:
-            print(f"Error calling LanguageTool API: {e}")
-            return LanguageToolCorrection(
-                original_text=text,
-                corrected_text=text,
-                errors=[],
-                explanation="Unable to check grammar at this time.",
-                timestamp=datetime.now()
-            )
-        except Exception as e:
-            print(f"Unexpected error in LanguageTool: {e}")
-            return LanguageToolCorrection(
-                original_text=text,
-                corrected_text=text,
-                errors=[],
-                explanation="Unable to check grammar at this time.",
-                timestamp=datetime.now()
-            )
+            # Overlapping matches are skipped so a replacement never clobbers the previous one
+            if error.replacements and error.offset >= cursor:
+                parts.append(text[cursor:error.offset])
+                parts.append(error.replacements[0])
+                cursor = error.offset + error.length
+        
+        parts.append(text[cursor:])
+        corrected_text = "".join(parts)
+        
+        explanation = self._create_explanation(errors)
+        
+        return LanguageToolCorrection(
+            original_text=text,
+            corrected_text=corrected_text,
+            errors=errors,
+            explanation=explanation,
+            timestamp=datetime.now()
+        )
+    
+    def _unavailable(self, text: str) -> LanguageToolCorrection:
+        """Correction returned when the API cannot be reached"""
+        return LanguageToolCorrection(
+            original_text=text,
+            corrected_text=text,
+            errors=[],
+            explanation="Unable to check grammar at this time.",
+            timestamp=datetime.now()
+        )
     
     def _create_explanation(self, errors: List[GrammarError]) -> str:
         """Create a human-friendly explanation of the errors found"""
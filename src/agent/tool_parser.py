@@ -0,0 +1,54 @@
+import ast
+import re
+from typing import Dict, Tuple, Type
+
+from pydantic import BaseModel
+
+from .tool_schemas import SaveGrammarCorrection, UpdateUserProfile, WebSearch
+
+TOOL_SCHEMAS: Dict[str, Type[BaseModel]] = {
+    "WebSearch": WebSearch,
+    "UpdateUserProfile": UpdateUserProfile,
+    "SaveGrammarCorrection": SaveGrammarCorrection,
+}
+
+# Matches the `ToolName(args)` form the AFM writes inside <tool_call>, with optional backticks
+_CALL_RE = re.compile(r"^\s*`?\s*(\w+)\s*\((.*)\)\s*`?\s*$", re.DOTALL)
+
+
+def parse_tool_call(tool_call_content: str) -> Tuple[str, BaseModel]:
+    """
+    Parses a `ToolName(arg=value, ...)` call written by the AFM into its validated schema.
+
+    Arguments must be Python literals. Positional arguments are mapped to the schema
+    fields in declaration order.
+
+    Raises:
+        SyntaxError: If the arguments are not a valid call expression.
+        ValueError: If the tool is unknown, an argument is not a literal or the
+            schema validation fails (pydantic's ValidationError is a ValueError).
+    """
+    match = _CALL_RE.match(tool_call_content)
+    if not match:
+        raise ValueError(f"Not a tool call: {tool_call_content}")
+
+    tool_name, args_source = match.groups()
+    schema = TOOL_SCHEMAS.get(tool_name)
+    if schema is None:
+        raise ValueError(f"Tool not recognized in: {tool_call_content}")
+
+    call = ast.parse(f"_({args_source})", mode="eval").body
+    if not isinstance(call, ast.Call):
+        raise ValueError(f"Invalid arguments for {tool_name}: {args_source}")
+
+    field_names = list(schema.model_fields)
+    if len(call.args) > len(field_names):
+        raise ValueError(f"Too many positional arguments for {tool_name}")
+
+    params = {name: ast.literal_eval(arg) for name, arg in zip(field_names, call.args)}
+    for keyword in call.keywords:
+        if keyword.arg is None:
+            raise ValueError(f"Unpacked arguments are not supported: {tool_call_content}")
+        params[keyword.arg] = ast.literal_eval(keyword.value)
+
+    return tool_name, schema.model_validate(params)
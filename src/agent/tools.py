@@ -1,25 +1,93 @@
+import asyncio
+import functools
 import logging
+import threading
 import uuid
-from typing import List, Literal, Optional
-from langchain_community.tools.tavily_search import TavilySearchResults
-from langchain_groq import ChatGroq
-from trustcall import create_extractor
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import List, Optional, Tuple
+from cachetools import TTLCache
+from langgraph.store.base import GetOp, Item, PutOp
 from langgraph.store.redis import RedisStore
 from sqlalchemy.orm import Session
-from .language_tool import LanguageToolAPI
+from ..database.core import after_commit
 from ..entities.user import User
 from ..entities.message import Message, MessageRole
 from ..entities.grammar_correction import GrammarCorrection
 from langchain_tavily import TavilySearch
 
-language_tool_instance = LanguageToolAPI()
-
 web_search_instance = TavilySearch(
     max_results=2,
     include_answer=False,
     include_raw_content=False
 )
 
+# Identical queries within a few minutes reuse the formatted results instead of hitting Tavily again
+_search_cache: TTLCache = TTLCache(maxsize=1024, ttl=300)
+
+# Profiles read for the AFM prompt. A worker sees its own profile updates as soon as the turn is
+# committed (write-through in update_user_profile); updates made by another worker show up once
+# the entry expires.
+_profile_cache: TTLCache = TTLCache(maxsize=4096, ttl=60)
+_profile_cache_lock = threading.Lock()
+
+# Store writes staged by tools while a batched_store_writes() block is active
+_pending_store_writes: ContextVar[Optional[list]] = ContextVar("pending_store_writes", default=None)
+
+@asynccontextmanager
+async def batched_store_writes(store: RedisStore, db_session: Session):
+    """
+    Collects the Redis store writes made by tools inside the block and sends them in a
+    single store.batch() call, instead of one round-trip per tool.
+
+    The batch only goes out after the turn's DB transaction is committed (see
+    database.core.after_commit), so Redis never holds data the database rolled back.
+    """
+    pending = []
+    token = _pending_store_writes.set(pending)
+    try:
+        yield
+    finally:
+        _pending_store_writes.reset(token)
+        if pending:
+            after_commit(db_session, functools.partial(store.batch, pending))
+
+def _store_put(store: RedisStore, namespace: tuple, key: str, value: dict) -> None:
+    """Writes to the store, or stages the write when running inside batched_store_writes()."""
+    pending = _pending_store_writes.get()
+    if pending is None:
+        store.put(namespace, key, value)
+    else:
+        pending.append(PutOp(namespace, key, value))
+
+def _cache_profile(user_id: str, profile: Optional[dict]) -> None:
+    with _profile_cache_lock:
+        _profile_cache[user_id] = profile
+
+def profile_get_op(user_id: str) -> GetOp:
+    """Store read of the user's profile. It is always saved under the same key, so no search is needed."""
+    return GetOp(("profile", user_id), "latest")
+
+def peek_cached_profile(user_id: str) -> Tuple[bool, Optional[dict]]:
+    """Returns (hit, profile) from the local profile cache, without touching Redis."""
+    with _profile_cache_lock:
+        if user_id in _profile_cache:
+            return True, _profile_cache[user_id]
+    return False, None
+
+def remember_profile(user_id: str, item: Optional[Item]) -> Optional[dict]:
+    """Caches the result of profile_get_op and returns the profile, or None if nothing was saved yet."""
+    profile = item.value if item else None
+    _cache_profile(user_id, profile)
+    return profile
+
+def _session_lock(db_session: Session) -> threading.Lock:
+    """
+    Lock guarding the request's DB session while tools run in worker threads.
+    Tool calls from the same AFM turn run concurrently but share one Session, which is not thread-safe.
+    """
+    return db_session.info.setdefault("tool_lock", threading.Lock())
+
 # Write-Through Cache Functions (data is simultaneously updated to cache and memory)
 async def update_user_profile(
     user_id: str,
@@ -31,34 +99,40 @@ async def update_user_profile(
     **kwargs
 ) -> str:
     """Receives already extracted profile data and saves it to the DB and Redis."""
-    print("\n[...Ferramenta 'update_user_profile' chamada com dados diretos...]")
-    try:
-        user_in_db = db_session.query(User).filter(User.id == user_id).first()
-        if not user_in_db:
-            return f"Error: User with ID {user_id} not found."
-
-        if name: user_in_db.first_name = name
-        if location: user_in_db.location = location
-        if interests_to_add:
-            current_interests = user_in_db.user_interests or []
-            user_in_db.user_interests = list(set(current_interests) | set(interests_to_add))
-        
-        db_session.commit()
-        db_session.refresh(user_in_db)
-
-        profile_to_cache = {
-            "name": user_in_db.first_name,
-            "location": user_in_db.location,
-            "interests": user_in_db.user_interests
-        }
-        store.put(("profile", user_id), "latest", profile_to_cache)
-        print(f"[...Cache do Redis atualizado: {profile_to_cache}...]")
-        
-        return "User profile updated successfully."
-    except Exception as e:
-        if db_session: db_session.rollback()
-        logging.error(f"Error in update_user_profile: {e}", exc_info=True)
-        return f"Failed to update profile: {e}"
+    logging.debug("Tool 'update_user_profile' called with extracted data")
+    lock = _session_lock(db_session)
+
+    # Blocking DB/Redis I/O runs in a worker thread to keep the event loop free
+    def _update() -> str:
+        with lock:
+            try:
+                user_in_db = db_session.query(User).filter(User.id == user_id).first()
+                if not user_in_db:
+                    return f"Error: User with ID {user_id} not found."
+
+                # Savepoint: a failure here only undoes this tool's changes, the turn is committed once by the caller
+                with db_session.begin_nested():
+                    if name: user_in_db.first_name = name
+                    if location: user_in_db.location = location
+                    if interests_to_add:
+                        current_interests = user_in_db.user_interests or []
+                        user_in_db.user_interests = list(set(current_interests) | set(interests_to_add))
+
+                profile_to_cache = {
+                    "name": user_in_db.first_name,
+                    "location": user_in_db.location,
+                    "interests": user_in_db.user_interests
+                }
+                _store_put(store, ("profile", user_id), "latest", profile_to_cache)
+                after_commit(db_session, functools.partial(_cache_profile, user_id, profile_to_cache))
+                logging.debug("Redis profile cache updated: %s", profile_to_cache)
+                
+                return "User profile updated successfully."
+            except Exception as e:
+                logging.error(f"Error in update_user_profile: {e}", exc_info=True)
+                return f"Failed to update profile: {e}"
+
+    return await asyncio.to_thread(_update)
 
 async def save_grammar_correction(
     user_id: str,
@@ -72,28 +146,39 @@ async def save_grammar_correction(
     **kwargs
 ) -> str:
     """Receives already structured correction data and saves it to the DB and Redis."""
-    print("\n[...Ferramenta 'save_grammar_correction' chamada com dados diretos...]")
-    try:
-        last_human_message = db_session.query(Message).filter(Message.conversation_id == conversation_id, Message.role == MessageRole.HUMAN).order_by(Message.created_at.desc()).first()
-        if not last_human_message:
-            return "Error: User message not found to link the correction."
-
-        correction_data = {
-            "original_text": original_text, "corrected_text": corrected_text,
-            "explanation": explanation, "improvement": improvement
-        }
-        
-        new_correction = GrammarCorrection(message_id=last_human_message.id, user_id=user_id, **correction_data)
-        db_session.add(new_correction)
-        db_session.commit()
-        
-        store.put(("corrections", user_id, conversation_id), str(uuid.uuid4()), correction_data)
-        
-        return "Grammar correction saved successfully."
-    except Exception as e:
-        if db_session: db_session.rollback()
-        logging.error(f"Error in save_grammar_correction: {e}", exc_info=True)
-        return f"Failed to save correction: {e}"
+    logging.debug("Tool 'save_grammar_correction' called with extracted data")
+    lock = _session_lock(db_session)
+
+    # Blocking DB/Redis I/O runs in a worker thread to keep the event loop free
+    def _save() -> str:
+        with lock:
+            try:
+                # The message of the current turn is still pending in the session (see process_new_message)
+                last_human_message = db_session.info.get("turn_user_message")
+                if last_human_message is None:
+                    last_human_message = db_session.query(Message).filter(Message.conversation_id == conversation_id, Message.role == MessageRole.HUMAN).order_by(Message.created_at.desc()).first()
+                if not last_human_message:
+                    return "Error: User message not found to link the correction."
+
+                correction_data = {
+                    "original_text": original_text, "corrected_text": corrected_text,
+                    "explanation": explanation, "improvement": improvement
+                }
+                
+                # Savepoint: a failure here only undoes this tool's changes, the turn is committed once by the caller
+                with db_session.begin_nested():
+                    # begin_nested() flushes first, so a pending message already has its id here
+                    new_correction = GrammarCorrection(message_id=last_human_message.id, user_id=user_id, **correction_data)
+                    db_session.add(new_correction)
+                
+                _store_put(store, ("corrections", user_id, conversation_id), str(uuid.uuid4()), correction_data)
+                
+                return "Grammar correction saved successfully."
+            except Exception as e:
+                logging.error(f"Error in save_grammar_correction: {e}", exc_info=True)
+                return f"Failed to save correction: {e}"
+
+    return await asyncio.to_thread(_save)
 
 
 async def execute_web_search(query: str, **kwargs) -> str:
@@ -108,18 +193,23 @@ async def execute_web_search(query: str, **kwargs) -> str:
         'response_time': float
     }
     """
+    cache_key = query.strip().lower()
+    cached = _search_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
     try:
-        result = web_search_instance.invoke({"query": query})
+        result = await web_search_instance.ainvoke({"query": query})
         
         # Formata a resposta para o AFM
         if isinstance(result, dict) and 'results' in result:
-            formatted_results = []
-            for item in result['results']:
-                formatted_results.append(
-                    f"[{item.get('title', 'No title')}]({item.get('url', '')})\n"
-                    f"{item.get('content', 'No content')}\n"
-                )
-            return "\n".join(formatted_results)
+            formatted = "\n".join(
+                f"[{item.get('title', 'No title')}]({item.get('url', '')})\n"
+                f"{item.get('content', 'No content')}\n"
+                for item in result['results']
+            )
+            _search_cache[cache_key] = formatted
+            return formatted
         
         # Fallback: retorna como string se o formato for diferente
         return str(result)
@@ -1,15 +1,16 @@
+import asyncio
 import os
-import tempfile
 import logging
+from typing import IO, Optional, Tuple
 from uuid import UUID
 from fastapi import APIRouter, HTTPException, status, UploadFile, File, Path
-from fastapi.responses import Response
+from fastapi.responses import Response, StreamingResponse
 
-from src.database.core import DbSession
+from src.database.core import DbSession, commit_session
 from src.auth.service import CurrentUser
 from src.conversations import service as conversation_service
 from src.conversations import models as conversation_models
-from src.tts.service import convert_text_to_speech
+from src.tts.service import convert_text_to_speech, get_cached_speech, open_speech_stream
 from .service import convert_audio_to_text
 
 router = APIRouter(
@@ -17,6 +18,70 @@ router = APIRouter(
     tags=["Audio"]
 )
 
+_ALLOWED_CT = frozenset({"audio/mpeg", "audio/mp4", "audio/wav", "audio/x-m4a", "audio/m4a"})
+
+# Voice settings used for every audio reply
+_TTS_SETTINGS = {"voice": "rachel", "stability": 0.6, "similarity_boost": 0.8}
+
+# MP3 of the fixed English-only reply, synthesized once at startup (see preload_english_only_audio)
+_english_only_audio: Optional[bytes] = None
+
+
+async def preload_english_only_audio() -> None:
+    """Synthesizes the English-only reply so non-English messages can be answered without calling TTS."""
+    global _english_only_audio
+    _english_only_audio = await convert_text_to_speech(message=conversation_service.ENGLISH_ONLY_REPLY, **_TTS_SETTINGS)
+    if _english_only_audio is None:
+        logging.warning("Could not pre-synthesize the English-only reply, it will be synthesized on demand.")
+
+async def _commit_and_speak(db: DbSession, message: str, headers: dict) -> Response:
+    """
+    Commits the turn and builds the audio response for the AI reply.
+    
+    The commit runs alongside the audio cache lookup. Cached audio is returned in full;
+    otherwise the ElevenLabs stream is opened only after the commit succeeded, so a failed
+    commit never leaves an opened stream (and its pooled connection) behind.
+    """
+    audio_content, _ = await asyncio.gather(
+        get_cached_speech(message, **_TTS_SETTINGS),
+        asyncio.to_thread(commit_session, db)
+    )
+    if audio_content is not None:
+        return Response(content=audio_content, media_type="audio/mpeg", headers=headers)
+    
+    audio_stream = await open_speech_stream(message, **_TTS_SETTINGS)
+    if audio_stream is None:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to convert response to speech"
+        )
+    return StreamingResponse(audio_stream, media_type="audio/mpeg", headers=headers)
+
+def _upload_to_transcribe(file: UploadFile) -> Tuple[str, IO[bytes]]:
+    """
+    Validates the uploaded audio and returns it ready to be sent to the transcription API.
+    
+    The upload is already kept by Starlette in a SpooledTemporaryFile, so it is passed
+    on as is instead of being copied to another temporary file.
+    
+    Args:
+        file: Uploaded audio file
+        
+    Returns:
+        Tuple of (filename with a normalized, lowercase extension, file object positioned at the start)
+    """
+    if file.content_type not in _ALLOWED_CT:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unsupported file type: {file.content_type}. Supported types: {sorted(_ALLOWED_CT)}"
+        )
+    
+    # Groq detects the format from the extension; untrusted names may have none or be upper case
+    ext = (os.path.splitext(file.filename or "")[1] or ".bin").lower()
+    
+    file.file.seek(0)
+    return f"audio{ext}", file.file
+
 @router.post("/new", status_code=status.HTTP_201_CREATED)
 async def create_new_audio_conversation(
     current_user: CurrentUser = None,
@@ -28,24 +93,12 @@ async def create_new_audio_conversation(
     Returns audio response with conversation metadata in headers.
     """
     user_id = current_user.get_uuid()
-    temp_file_path = None
     
     try:
-        allowed_types = ["audio/mpeg", "audio/mp4", "audio/wav", "audio/x-m4a", "audio/m4a"]
-        if file.content_type not in allowed_types:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Unsupported file type: {file.content_type}. Supported types: {allowed_types}"
-            )
-        
-        # Save uploaded file temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix=f".{file.filename.split('.')[-1]}") as temp_file:
-            temp_file_path = temp_file.name
-            content = await file.read()
-            temp_file.write(content)
+        filename, audio_file = _upload_to_transcribe(file)
                 
         # Convert audio to text
-        transcribed_text = await convert_audio_to_text(temp_file_path)
+        transcribed_text = await convert_audio_to_text(audio_file, filename)
         if not transcribed_text:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -59,30 +112,17 @@ async def create_new_audio_conversation(
         conversation_response = await conversation_service.create_new_conversation(
             db=db,
             user_id=user_id,
-            request=new_conversation_request
+            request=new_conversation_request,
+            commit=False
         )
         
         logging.info(f"Created new conversation: {conversation_response.conversation_id}")
         
-        # Convert AI response to speech
-        audio_content = convert_text_to_speech(
-            message=conversation_response.response,
-            voice="rachel",
-            stability=0.6,
-            similarity_boost=0.8
-        )
-        
-        if not audio_content:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to convert response to speech"
-            )
-                
-        # Return audio with conversation data in headers
-        return Response(
-            content=audio_content,
-            media_type="audio/mpeg",
-            headers={
+        # Commit the turn and convert AI response to speech, returning audio with conversation data in headers
+        return await _commit_and_speak(
+            db,
+            conversation_response.response,
+            {
                 "Content-Disposition": "attachment; filename=response.mp3",
                 "X-Conversation-ID": str(conversation_response.conversation_id),
                 "X-Conversation-Title": conversation_response.title,
@@ -98,14 +138,6 @@ async def create_new_audio_conversation(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"An error occurred creating the audio conversation: {str(e)}"
         )
-    finally:
-        # Clean up temporary file
-        if temp_file_path and os.path.exists(temp_file_path):
-            try:
-                os.unlink(temp_file_path)
-                logging.info(f"Cleaned up temporary file: {temp_file_path}")
-            except Exception as e:
-                logging.warning(f"Failed to clean up temporary file {temp_file_path}: {e}")
 
 @router.post("/chat/{conversation_id}")
 async def continue_audio_conversation(
@@ -119,28 +151,15 @@ async def continue_audio_conversation(
     Returns only the audio response.
     """
     user_id = current_user.get_uuid()
-    temp_file_path = None
     
     try:
-        conversation_service.get_conversation_history(db, user_id, conversation_id)
-        
-        allowed_types = ["audio/mpeg", "audio/mp4", "audio/wav", "audio/x-m4a", "audio/m4a"]
-        if file.content_type not in allowed_types:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Unsupported file type: {file.content_type}. Supported types: {allowed_types}"
-            )
-        
-        # Save uploaded file temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix=f".{file.filename.split('.')[-1]}") as temp_file:
-            temp_file_path = temp_file.name
-            content = await file.read()
-            temp_file.write(content)
+        filename, audio_file = _upload_to_transcribe(file)
         
-        logging.info(f"Saved audio message temporarily: {temp_file_path}")
+        # Ownership is checked before the (paid) transcription starts
+        await asyncio.to_thread(conversation_service.ensure_conversation_owned, db, user_id, conversation_id)
         
         # Convert audio to text
-        transcribed_text = await convert_audio_to_text(temp_file_path)
+        transcribed_text = await convert_audio_to_text(audio_file, filename)
         if not transcribed_text:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -149,33 +168,34 @@ async def continue_audio_conversation(
         
         logging.info(f"Transcribed message: {transcribed_text}")
         
+        # Fast path: the reply to a non-English message is always the same, and so is its audio
+        if _english_only_audio is not None and conversation_service.is_non_english(transcribed_text):
+            await asyncio.to_thread(
+                conversation_service.save_english_only_turn, db, conversation_id, transcribed_text
+            )
+            return Response(
+                content=_english_only_audio,
+                media_type="audio/mpeg",
+                headers={
+                    "Content-Disposition": "attachment; filename=response.mp3",
+                    "Access-Control-Expose-Headers": "Content-Disposition"
+                }
+            )
+        
         final_answer = await conversation_service.process_new_message(
             db=db,
             user_id=user_id,
             conversation_id=conversation_id,
-            user_input=transcribed_text
+            user_input=transcribed_text,
+            commit=False
         )
         
         
-        # Convert AI response to speech
-        audio_content = convert_text_to_speech(
-            message=final_answer,
-            voice="rachel",
-            stability=0.6,
-            similarity_boost=0.8
-        )
-        
-        if not audio_content:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to convert response to speech"
-            )
-                
-        # Return only audio
-        return Response(
-            content=audio_content,
-            media_type="audio/mpeg",
-            headers={
+        # Commit the turn and convert AI response to speech, returning only audio
+        return await _commit_and_speak(
+            db,
+            final_answer,
+            {
                 "Content-Disposition": "attachment; filename=response.mp3",
                 "Access-Control-Expose-Headers": "Content-Disposition"
             }
@@ -189,11 +209,3 @@ async def continue_audio_conversation(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"An error occurred processing the audio: {str(e)}"
         )
-    finally:
-        # Clean up temporary file
-        if temp_file_path and os.path.exists(temp_file_path):
-            try:
-                os.unlink(temp_file_path)
-                logging.info(f"Cleaned up temporary file: {temp_file_path}")
-            except Exception as e:
-                logging.warning(f"Failed to clean up temporary file {temp_file_path}: {e}")
\ No newline at end of file
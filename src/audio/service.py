@@ -1,34 +1,60 @@
 import logging
-from typing import Optional
-from groq import Groq
+import httpx
+from types import MappingProxyType
+from typing import IO, Mapping, Optional
+from groq import AsyncGroq
 from decouple import config
 
-# Configure Groq client
-client = Groq(api_key=config("GROQ_API_KEY"))
+GROQ_API_KEY = config("GROQ_API_KEY")
 
-async def convert_audio_to_text(audio_file_path: str, model: str = "whisper-large-v3-turbo") -> Optional[str]:
+# Groq client on a long-lived connection pool, so transcriptions reuse warm TLS connections.
+# Created on first use and dropped by close_client(), so every app lifespan gets an open client.
+_client: Optional[AsyncGroq] = None
+
+def _get_client() -> AsyncGroq:
+    global _client
+    if _client is None:
+        _client = AsyncGroq(
+            api_key=GROQ_API_KEY,
+            http_client=httpx.AsyncClient(
+                timeout=30,
+                limits=httpx.Limits(max_keepalive_connections=32, max_connections=64)
+            )
+        )
+    return _client
+
+_SUPPORTED_FORMATS = frozenset({"flac", "mp3", "mp4", "mpeg", "mpga", "m4a", "ogg", "wav", "webm"})
+
+# Read-only view so callers can't change the shared limits
+_AUDIO_LIMITS = MappingProxyType({
+    "max_file_size_mb": 25,  # 25MB for free tier, 100MB for dev tier
+    "min_duration_seconds": 0.01,
+    "min_billed_duration_seconds": 10  # Minimum billing is 10 seconds
+})
+
+async def convert_audio_to_text(audio_file: IO[bytes], filename: str, model: str = "whisper-large-v3-turbo") -> Optional[str]:
     """
     Convert audio file to text using Groq Whisper API.
     
     Args:
-        audio_file_path: Path to the audio file
+        audio_file: Binary file object with the audio (e.g. the upload's spooled file)
+        filename: Original name of the file, used by the API to detect the format
         model: Whisper model to use (whisper-large-v3-turbo or whisper-large-v3)
     
     Returns:
         Transcribed text if successful, None if failed
     """
     try:
-        logging.info(f"Transcribing audio file: {audio_file_path}")
-        
-        with open(audio_file_path, "rb") as audio_file:
-            # Groq Whisper for transcription
-            transcription = client.audio.transcriptions.create(
-                file=audio_file,
-                model=model,
-                language="en",
-                temperature=0.0,
-                response_format="json"
-            )
+        logging.info(f"Transcribing audio file: {filename}")
+        
+        # Groq Whisper for transcription
+        transcription = await _get_client().audio.transcriptions.create(
+            file=(filename, audio_file),
+            model=model,
+            language="en",
+            temperature=0.0,
+            response_format="json"
+        )
         
         transcribed_text = transcription.text.strip()
         
@@ -44,7 +70,8 @@ async def convert_audio_to_text(audio_file_path: str, model: str = "whisper-larg
         return None
 
 async def convert_audio_to_text_with_metadata(
-    audio_file_path: str, 
+    audio_file: IO[bytes],
+    filename: str,
     model: str = "whisper-large-v3-turbo",
     include_timestamps: bool = False
 ) -> Optional[dict]:
@@ -52,7 +79,8 @@ async def convert_audio_to_text_with_metadata(
     Convert audio file to text with detailed metadata using Groq Whisper API.
     
     Args:
-        audio_file_path: Path to the audio file
+        audio_file: Binary file object with the audio
+        filename: Original name of the file, used by the API to detect the format
         model: Whisper model to use (whisper-large-v3-turbo or whisper-large-v3)
         include_timestamps: Whether to include word-level timestamps
     
@@ -60,22 +88,21 @@ async def convert_audio_to_text_with_metadata(
         Dictionary with transcription and metadata if successful, None if failed
     """
     try:
-        logging.info(f"Transcribing audio file with metadata: {audio_file_path}")
+        logging.info(f"Transcribing audio file with metadata: {filename}")
         
         timestamp_granularities = ["segment"]
         if include_timestamps:
             timestamp_granularities.append("word")
         
-        with open(audio_file_path, "rb") as audio_file:
-            # Groq Whisper for transcription with verbose output
-            transcription = client.audio.transcriptions.create(
-                file=audio_file,
-                model=model,
-                language="en",
-                temperature=0.0,
-                response_format="verbose_json",
-                timestamp_granularities=timestamp_granularities
-            )
+        # Groq Whisper for transcription with verbose output
+        transcription = await _get_client().audio.transcriptions.create(
+            file=(filename, audio_file),
+            model=model,
+            language="en",
+            temperature=0.0,
+            response_format="verbose_json",
+            timestamp_granularities=timestamp_granularities
+        )
         
         if not transcription.text.strip():
             logging.warning("Transcription resulted in empty text")
@@ -95,37 +122,37 @@ async def convert_audio_to_text_with_metadata(
         logging.error(f"Groq API error during transcription with metadata: {e}")
         return None
 
-async def convert_audio_to_text_optimized(audio_file_path: str, context: str = "") -> Optional[str]:
+async def convert_audio_to_text_optimized(audio_file: IO[bytes], filename: str, context: str = "") -> Optional[str]:
     """
     Convert audio file to text with optimized settings for English learning context.
     
     Args:
-        audio_file_path: Path to the audio file
+        audio_file: Binary file object with the audio
+        filename: Original name of the file, used by the API to detect the format
         context: Context or prompt to guide transcription style
     
     Returns:
         Transcribed text if successful, None if failed
     """
     try:
-        logging.info(f"Transcribing audio file (optimized): {audio_file_path}")
+        logging.info(f"Transcribing audio file (optimized): {filename}")
         
         # whisper-large-v3 for accuracy when context is important
         model = "whisper-large-v3" if context else "whisper-large-v3-turbo"
         
-        with open(audio_file_path, "rb") as audio_file:
-            transcription_params = {
-                "file": audio_file,
-                "model": model,
-                "language": "en",
-                "temperature": 0.0,
-                "response_format": "json"
-            }
-            
-            # Add prompt if context is provided (max 224 tokens)
-            if context:
-                transcription_params["prompt"] = context[:224]
-            
-            transcription = client.audio.transcriptions.create(**transcription_params)
+        transcription_params = {
+            "file": (filename, audio_file),
+            "model": model,
+            "language": "en",
+            "temperature": 0.0,
+            "response_format": "json"
+        }
+        
+        # Add prompt if context is provided (max 224 tokens)
+        if context:
+            transcription_params["prompt"] = context[:224]
+        
+        transcription = await _get_client().audio.transcriptions.create(**transcription_params)
         
         transcribed_text = transcription.text.strip()
         
@@ -140,27 +167,32 @@ async def convert_audio_to_text_optimized(audio_file_path: str, context: str = "
         logging.error(f"Groq API error during optimized transcription: {e}")
         return None
 
-def get_supported_audio_formats() -> list:
+async def close_client() -> None:
+    """
+    Close the Groq client and its pooled connections. The next transcription creates a new one.
     """
-    Get list of supported audio formats for Groq transcription.
+    global _client
+    if _client is not None:
+        closing, _client = _client, None
+        await closing.close()
+
+def get_supported_audio_formats() -> frozenset:
+    """
+    Get the supported audio formats for Groq transcription.
     
     Returns:
-        List of supported file extensions
+        Frozenset of supported file extensions
     """
-    return ["flac", "mp3", "mp4", "mpeg", "mpga", "m4a", "ogg", "wav", "webm"]
+    return _SUPPORTED_FORMATS
 
-def get_audio_file_limits() -> dict:
+def get_audio_file_limits() -> Mapping:
     """
     Get audio file size and duration limits for Groq API.
     
     Returns:
-        Dictionary with size and duration limits
+        Read-only mapping with size and duration limits
     """
-    return {
-        "max_file_size_mb": 25,  # 25MB for free tier, 100MB for dev tier
-        "min_duration_seconds": 0.01,
-        "min_billed_duration_seconds": 10  # Minimum billing is 10 seconds
-    }
+    return _AUDIO_LIMITS
 
 def get_available_models() -> dict:
     """
@@ -207,16 +239,14 @@ def validate_audio_file(audio_file_path: str) -> tuple[bool, str]:
             return False, "Audio file not found"
         
         file_size_mb = os.path.getsize(audio_file_path) / (1024 * 1024)
-        limits = get_audio_file_limits()
         
-        if file_size_mb > limits["max_file_size_mb"]:
-            return False, f"File size ({file_size_mb:.1f}MB) exceeds limit ({limits['max_file_size_mb']}MB)"
+        if file_size_mb > _AUDIO_LIMITS["max_file_size_mb"]:
+            return False, f"File size ({file_size_mb:.1f}MB) exceeds limit ({_AUDIO_LIMITS['max_file_size_mb']}MB)"
         
-        file_extension = audio_file_path.lower().split('.')[-1]
-        supported_formats = get_supported_audio_formats()
+        file_extension = os.path.splitext(audio_file_path)[1].lower().lstrip('.')
         
-        if file_extension not in supported_formats:
-            return False, f"Unsupported file format. Supported: {', '.join(supported_formats)}"
+        if file_extension not in _SUPPORTED_FORMATS:
+            return False, f"Unsupported file format. Supported: {', '.join(sorted(_SUPPORTED_FORMATS))}"
         
         return True, "Valid audio file"
         
@@ -55,13 +55,12 @@ async def chat_in_conversation(
 ):
     """Envia uma nova mensagem para uma conversa existente."""
     try:
-        service.get_conversation_history(db, current_user.get_uuid(), conversation_id)
-        
         response_content = await service.process_new_message(
             db=db,
             user_id=current_user.get_uuid(),
             conversation_id=conversation_id,
-            user_input=request.content
+            user_input=request.content,
+            verify_owner=True
         )
         return models.ChatResponse(response=response_content)
     except ConversationNotFoundError:
@@ -1,18 +1,25 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from uuid import UUID
 from datetime import datetime
 from typing import List, Literal, Optional
 
 from src.entities.message import MessageRole
 
+# Corpo das requisições: campos desconhecidos são descartados e o texto já chega sem espaços nas pontas
+_REQUEST_CONFIG = ConfigDict(extra="ignore", str_strip_whitespace=True, frozen=True)
+# Respostas podem ser montadas direto de linhas/objetos do banco
+_RESPONSE_CONFIG = ConfigDict(from_attributes=True)
+
 class ConversationListItem(BaseModel):
     """Representa um item na lista de conversas do usuário."""
+    model_config = _RESPONSE_CONFIG
     id: UUID
     title: str
     updated_at: datetime
 
 class GrammarCorrectionDetail(BaseModel):
     """Representa os detalhes de uma correção gramatical vinculada a uma mensagem."""
+    model_config = _RESPONSE_CONFIG
     original_text: str
     corrected_text: str
     explanation: str
@@ -20,6 +27,7 @@ class GrammarCorrectionDetail(BaseModel):
 
 class MessageDetail(BaseModel):
     """Representa uma única mensagem detalhada no histórico de uma conversa."""
+    model_config = _RESPONSE_CONFIG
     id: UUID
     role: MessageRole
     content: str
@@ -27,24 +35,29 @@ class MessageDetail(BaseModel):
 
 class ConversationHistoryResponse(BaseModel):
     """Representa o histórico completo de uma conversa específica."""
+    model_config = _RESPONSE_CONFIG
     id: UUID
     title: str
     messages: List[MessageDetail]
 
 class NewConversationRequest(BaseModel):
     """Define a estrutura para criar uma nova conversa com a primeira mensagem."""
+    model_config = _REQUEST_CONFIG
     content: str = Field(..., description="O conteúdo da primeira mensagem do usuário.")
 
 class NewConversationResponse(BaseModel):
     """Define a resposta ao criar uma nova conversa."""
+    model_config = _RESPONSE_CONFIG
     response: str
     conversation_id: UUID
     title: str
 
 class ChatRequest(BaseModel):
     """Define a estrutura para enviar uma nova mensagem para uma conversa existente."""
+    model_config = _REQUEST_CONFIG
     content: str = Field(..., description="O conteúdo da nova mensagem do usuário.")
 
 class ChatResponse(BaseModel):
     """Define a resposta para uma nova mensagem em uma conversa existente."""
+    model_config = _RESPONSE_CONFIG
     response: str
\ No newline at end of file
@@ -1,144 +1,267 @@
+import asyncio
+import functools
 import logging
 import traceback
+from datetime import datetime, timedelta
 from uuid import UUID, uuid4
-from datetime import datetime
-from typing import List
-from sqlalchemy.orm import Session, selectinload
+from typing import List, Optional, Tuple
+from langgraph.store.base import Item
+from pydantic import TypeAdapter
+from sqlalchemy import delete, exists, select, update
+from sqlalchemy.orm import Session
 
 from . import models
 from ..entities.conversation import Conversation
 from ..entities.message import Message, MessageRole
+from ..entities.grammar_correction import GrammarCorrection
 from ..exceptions import ConversationNotFoundError
 
 from ..agent.grammar_pipe import create_preprocessing_graph
 from ..agent.afm_executor import run_afm_cycle
-from ..database.core import store_instance as store
+from ..agent.history_buffer import append_history, buffer_get_op, clear_history, render_history
+from ..agent.tools import peek_cached_profile, profile_get_op, remember_profile
+from ..database.core import after_commit, commit_session, store_instance as store, utcnow
 from ..users.service import get_user_profile
-from langdetect import detect, LangDetectException
+import cld3
 
 preprocessing_graph = create_preprocessing_graph()
 
+_HISTORY_ADAPTER = TypeAdapter(List[models.MessageDetail])
+_CONVERSATION_LIST_ADAPTER = TypeAdapter(List[models.ConversationListItem])
+
+# Abaixo desse tamanho, mensagens só com caracteres ASCII não passam pela detecção de idioma
+SHORT_ASCII_INPUT_CHARS = 12
+
+ENGLISH_ONLY_REPLY = "I'm sorry, I can only chat in English. Could you please rephrase your message?"
+
 
 def get_user_conversations_list(db: Session, user_id: UUID) -> List[models.ConversationListItem]:
     """Busca a lista de conversas do usuário."""
-    conversations = (
-        db.query(Conversation)
-        .filter(Conversation.user_id == user_id)
+    # Só as três colunas da listagem, sem materializar objetos ORM
+    rows = db.execute(
+        select(Conversation.id, Conversation.title, Conversation.updated_at)
+        .where(Conversation.user_id == user_id)
         .order_by(Conversation.updated_at.desc())
-        .all()
+    ).all()
+    # As linhas são lidas por atributo (from_attributes), sem montar dicts intermediários
+    return _CONVERSATION_LIST_ADAPTER.validate_python(rows)
+
+def ensure_conversation_owned(db: Session, user_id: UUID, conversation_id: UUID) -> None:
+    """Garante que a conversa existe e pertence ao usuário, sem carregar suas mensagens."""
+    owned = db.scalar(
+        select(exists().where(Conversation.id == conversation_id, Conversation.user_id == user_id))
     )
-    return [
-        models.ConversationListItem(
-            id=conv.id, title=conv.title, updated_at=conv.updated_at
-        )
-        for conv in conversations
-    ]
+    if not owned:
+        raise ConversationNotFoundError(conversation_id)
 
 def get_conversation_history(db: Session, user_id: UUID, conversation_id: UUID) -> models.ConversationHistoryResponse:
     """Busca o histórico completo de uma conversa com suas mensagens e correções."""
-    conversation = (
-        db.query(Conversation)
-        .options(
-            selectinload(Conversation.messages).options(
-                selectinload(Message.correction)
-            )
+    # Uma única consulta: conversa, mensagens e correções vêm na mesma leitura (outer join
+    # para que uma conversa ainda sem mensagens continue sendo encontrada)
+    rows = db.execute(
+        select(
+            Conversation.id,
+            Conversation.title,
+            Message.id.label("message_id"),
+            Message.role,
+            Message.content,
+            GrammarCorrection.original_text,
+            GrammarCorrection.corrected_text,
+            GrammarCorrection.explanation,
+            GrammarCorrection.improvement,
         )
-        .filter(Conversation.id == conversation_id, Conversation.user_id == user_id)
-        .first()
-    )
+        .select_from(Conversation)
+        .outerjoin(Message, Message.conversation_id == Conversation.id)
+        .outerjoin(GrammarCorrection, GrammarCorrection.message_id == Message.id)
+        .where(Conversation.id == conversation_id, Conversation.user_id == user_id)
+        .order_by(Message.created_at)
+    ).all()
 
-    if not conversation:
+    if not rows:
         raise ConversationNotFoundError(conversation_id)
 
-    message_details = []
-    for msg in conversation.messages:
-        correction_detail = None
-        if msg.correction:
-            correction_detail = models.GrammarCorrectionDetail(
-                original_text=msg.correction.original_text,
-                corrected_text=msg.correction.corrected_text,
-                explanation=msg.correction.explanation,
-                improvement=msg.correction.improvement,
-            )
-        message_details.append(models.MessageDetail(
-            id=msg.id,
-            role=msg.role,
-            content=msg.content,
-            correction=correction_detail
-        ))
+    # Valida a lista inteira de uma vez pelo núcleo do pydantic, em vez de um modelo por mensagem
+    message_details = _HISTORY_ADAPTER.validate_python([
+        {
+            "id": row.message_id,
+            "role": row.role,
+            "content": row.content,
+            "correction": {
+                "original_text": row.original_text,
+                "corrected_text": row.corrected_text,
+                "explanation": row.explanation,
+                "improvement": row.improvement,
+            } if row.original_text is not None else None,
+        }
+        for row in rows
+        if row.message_id is not None
+    ])
     
-    return models.ConversationHistoryResponse(
-        id=conversation.id,
-        title=conversation.title,
+    # Os campos externos já vêm validados do banco
+    return models.ConversationHistoryResponse.model_construct(
+        id=rows[0].id,
+        title=rows[0].title,
         messages=message_details
     )
 
+def _append_turn_to_history(conversation_id: UUID, user_input: str, ai_response: str) -> None:
+    """Acrescenta o turno ao histórico em cache no Redis, sem falhar a requisição se o Redis falhar."""
+    try:
+        append_history(store, str(conversation_id), [
+            {"role": MessageRole.HUMAN.value, "content": user_input},
+            {"role": MessageRole.AI.value, "content": ai_response},
+        ])
+    except Exception as e:
+        logging.warning(f"Failed to update cached history for conversation {conversation_id}: {e}")
+
+def _read_turn_context(user_id: str, conversation_id: str) -> Tuple[Optional[dict], Optional[Item]]:
+    """
+    Lê o perfil do usuário e o histórico em cache da conversa numa única chamada ao store.
+    O perfil só vai ao Redis quando não está no cache local (veja tools._profile_cache).
+    """
+    profile_cached, profile = peek_cached_profile(user_id)
+    ops = [buffer_get_op(conversation_id)]
+    if not profile_cached:
+        ops.append(profile_get_op(user_id))
+    
+    results = store.batch(ops)
+    if not profile_cached:
+        profile = remember_profile(user_id, results[1])
+    return profile, results[0]
+
+def _timestamp_after(previous: datetime) -> datetime:
+    """
+    Horário atual, garantidamente posterior a `previous`.
+
+    As mensagens de um turno vão na mesma transação e o histórico é ordenado só por
+    created_at, então o horário é fixado ao criar cada mensagem e a resposta nunca empata
+    com (nem fica antes da) mensagem do usuário.
+    """
+    return max(datetime.utcnow(), previous + timedelta(microseconds=1))
+
+def is_non_english(user_input: str) -> bool:
+    """Indica se a mensagem foi detectada, com confiança, como escrita em outro idioma que não o inglês."""
+    # Respostas curtas em ASCII ("yes", "ok", "thanks") são tratadas como inglês: a detecção nelas
+    # é pouco confiável e seria o único custo do caso mais comum
+    if len(user_input) < SHORT_ASCII_INPUT_CHARS and user_input.isascii():
+        return False
+    # O cld3 retorna None em vez de lançar exceção quando não consegue detectar o idioma
+    prediction = cld3.get_language(user_input)
+    return bool(prediction and prediction.is_reliable and prediction.language != 'en')
+
+def save_english_only_turn(db: Session, conversation_id: UUID, user_input: str, commit: bool = True) -> str:
+    """Salva a mensagem do usuário com a resposta fixa de "somente inglês" e retorna essa resposta."""
+    # Salva a mensagem do usuário
+    user_message = Message(
+        conversation_id=conversation_id,
+        role=MessageRole.HUMAN,
+        content=user_input,
+        created_at=datetime.utcnow()
+    )
+    db.add(user_message)
+
+    # Salva a resposta da IA
+    ai_message = Message(
+        conversation_id=conversation_id,
+        role=MessageRole.AI,
+        content=ENGLISH_ONLY_REPLY,
+        created_at=_timestamp_after(user_message.created_at)
+    )
+    db.add(ai_message)
+    # O cache do histórico só recebe o turno depois que ele estiver de fato no banco
+    after_commit(db, functools.partial(_append_turn_to_history, conversation_id, user_input, ENGLISH_ONLY_REPLY))
+    if commit:
+        commit_session(db)
+    
+    return ENGLISH_ONLY_REPLY
+
 async def process_new_message(
     db: Session,
     user_id: UUID,
     conversation_id: UUID,
     user_input: str,
+    commit: bool = True,
+    verify_owner: bool = False,
 ) -> str:
     """
     Função central que processa uma nova mensagem de usuário, seja em uma conversa nova ou existente.
-    """
 
-    try:
-        lang = detect(user_input)
-        if lang != 'en':
-            ai_response = "I'm sorry, I can only chat in English. Could you please rephrase your message?"
-            
-            # Salva a mensagem do usuário
-            user_message = Message(
-                conversation_id=conversation_id,
-                role=MessageRole.HUMAN,
-                content=user_input
-            )
-            db.add(user_message)
+    Com `commit=False` a resposta da IA fica pendente na sessão e o commit final fica a cargo
+    de quem chamou, que pode sobrepô-lo a outro trabalho (ex.: a síntese de voz). Esse commit
+    deve ser feito com database.core.commit_session, que só então grava os caches do Redis
+    (histórico, perfil e correções) agendados com after_commit.
 
-            # Salva a resposta da IA
-            ai_message = Message(
-                conversation_id=conversation_id,
-                role=MessageRole.AI,
-                content=ai_response
-            )
-            db.add(ai_message)
-            db.commit()
-            
-            return ai_response
-    except LangDetectException:
-        logging.warning("Language detection failed for input. Proceeding as if it is English.")
+    Com `verify_owner=True` a posse da conversa é conferida aqui (veja ensure_conversation_owned),
+    em paralelo com a leitura do contexto no Redis, em vez de numa consulta anterior.
+    """
+
+    # A sessão é síncrona: todo acesso ao banco feito daqui roda numa thread para não
+    # bloquear o event loop durante as idas e voltas ao Postgres
+    if is_non_english(user_input):
+        def _english_only_turn() -> str:
+            if verify_owner:
+                ensure_conversation_owned(db, user_id, conversation_id)
+            return save_english_only_turn(db, conversation_id, user_input, commit=commit)
+        return await asyncio.to_thread(_english_only_turn)
 
-    # Salva a mensagem do usuário no banco de dados primeiro
+    # A mensagem do usuário fica pendente na sessão e é gravada junto com a resposta da IA no
+    # commit final. As ferramentas a encontram em db.info: se uma correção for salva,
+    # o savepoint dela grava a mensagem antes (veja tools.save_grammar_correction)
     user_message = Message(
         conversation_id=conversation_id,
         role=MessageRole.HUMAN,
-        content=user_input
+        content=user_input,
+        created_at=datetime.utcnow()
     )
     db.add(user_message)
-    db.commit()
-    db.refresh(user_message)
+    db.info["turn_user_message"] = user_message
     
-    # Carrega o histórico da conversa e o perfil do usuário
-    history = get_conversation_history(db, user_id, conversation_id)
-    conversation_history_list = [{"role": msg.role, "content": msg.content} for msg in history.messages]
+    # O histórico vem do cache no Redis; o banco só é consultado quando o cache ainda não existe.
+    # Sem autoflush, a consulta não inclui a mensagem pendente deste turno.
+    def load_history() -> list:
+        history = get_conversation_history(db, user_id, conversation_id)
+        return [
+            {"role": msg.role.value, "content": msg.content}
+            for msg in history.messages
+        ]
     
-    # Carrega o perfil do Redis
-    profile_namespace = ("profile", str(user_id))
-    existing_profile = store.search(profile_namespace)
-    user_profile_str = "Nenhum perfil salvo ainda."
-    if existing_profile:
-        user_profile_str = str(existing_profile[0].value)
+    def start_preprocessing() -> "asyncio.Task[dict]":
+        return asyncio.create_task(preprocessing_graph.ainvoke({"user_input": user_input}))
+
+    # Executa o pipeline de préprocessamento em paralelo com a leitura do perfil e do histórico.
+    # Com verify_owner ele só começa depois da checagem de posse, para não gastar chamadas pagas
+    # ao LLM com a conversa de outro usuário.
+    preprocessing_task = None if verify_owner else start_preprocessing()
+    try:
+        # Carrega perfil e histórico em cache numa thread. A checagem de posse (Postgres) é
+        # independente e roda junto.
+        turn_context = asyncio.to_thread(_read_turn_context, str(user_id), str(conversation_id))
+        if verify_owner:
+            _, (existing_profile, history_item) = await asyncio.gather(
+                asyncio.to_thread(ensure_conversation_owned, db, user_id, conversation_id),
+                turn_context,
+            )
+            preprocessing_task = start_preprocessing()
+        else:
+            existing_profile, history_item = await turn_context
 
-    # Executa o pipeline de préprocessamento
-    pipeline_state = preprocessing_graph.invoke({"user_input": user_input})
+        history_str = await render_history(store, str(conversation_id), history_item, load_history)
+        pipeline_state = await preprocessing_task
+    except BaseException:
+        if preprocessing_task is not None:
+            preprocessing_task.cancel()
+        raise
     syntactic_analysis = pipeline_state.get("syntactic_analysis", "")
     semantic_analysis = pipeline_state.get("semantic_analysis", "")
 
+    user_profile_str = "Nenhum perfil salvo ainda."
+    if existing_profile:
+        user_profile_str = str(existing_profile)
+
     # Executa o agente AFM
     final_answer = await run_afm_cycle(
         user_input=user_input,
-        conversation_history=conversation_history_list,
+        history=history_str,
         user_profile=user_profile_str,
         syntactic_analysis=syntactic_analysis,
         semantic_analysis=semantic_analysis,
@@ -152,22 +275,35 @@ async def process_new_message(
     ai_message = Message(
         conversation_id=conversation_id,
         role=MessageRole.AI,
-        content=final_answer
+        content=final_answer,
+        created_at=_timestamp_after(user_message.created_at)
     )
     db.add(ai_message)
     
-    # Atualiza o timestamp da conversa
-    conversation = db.query(Conversation).filter(Conversation.id == conversation_id).first()
-    if conversation:
-        conversation.updated_at = datetime.utcnow()
-        
-    db.commit()
+    def _finish_turn() -> None:
+        # Atualiza o timestamp da conversa sem carregá-la; o próprio banco gera o horário
+        db.execute(
+            update(Conversation)
+            .where(Conversation.id == conversation_id)
+            .values(updated_at=utcnow())
+        )
+        if commit:
+            commit_session(db)
+    
+    # O cache do histórico só recebe o turno depois que ele estiver de fato no banco
+    after_commit(db, functools.partial(_append_turn_to_history, conversation_id, user_input, final_answer))
+    await asyncio.to_thread(_finish_turn)
     
     return final_answer
 
 
-async def create_new_conversation(db: Session, user_id: UUID, request: models.NewConversationRequest) -> models.NewConversationResponse:
-    """Cria uma nova conversa e processa a primeira mensagem."""
+async def create_new_conversation(
+    db: Session,
+    user_id: UUID,
+    request: models.NewConversationRequest,
+    commit: bool = True,
+) -> models.NewConversationResponse:
+    """Cria uma nova conversa e processa a primeira mensagem (veja `commit` em process_new_message)."""
     title = request.content[:60].strip() + ("..." if len(request.content) > 60 else "")
     
     # Cria a nova conversa no DB
@@ -176,15 +312,15 @@ async def create_new_conversation(db: Session, user_id: UUID, request: models.Ne
         title=title,
     )
     db.add(new_conversation)
-    db.commit()
-    db.refresh(new_conversation)
+    await asyncio.to_thread(db.flush)
     
     # Processa a primeira mensagem usando a função central
     final_answer = await process_new_message(
         db=db,
         user_id=user_id,
         conversation_id=new_conversation.id,
-        user_input=request.content
+        user_input=request.content,
+        commit=commit,
     )
     
     return models.NewConversationResponse(
@@ -211,30 +347,41 @@ def delete_conversation(
         PermissionError: If user doesn't own the conversation
     """
     try:
-        conversation = (
-            db.query(Conversation)
-            .filter(
-                Conversation.id == conversation_id,
-                Conversation.user_id == user_id
-            )
-            .first()
+        # Deletes em massa em vez de carregar a conversa e deixar o cascade do ORM buscar
+        # mensagens e correções. As FKs não têm ON DELETE CASCADE, então os filhos vão
+        # primeiro, restritos às conversas do próprio usuário.
+        owned_conversation = select(Conversation.id).where(
+            Conversation.id == conversation_id,
+            Conversation.user_id == user_id
         )
+        owned_messages = select(Message.id).where(Message.conversation_id.in_(owned_conversation))
         
-        if not conversation:
-            existing_conversation = (
-                db.query(Conversation)
-                .filter(Conversation.id == conversation_id)
-                .first()
-            )
+        db.execute(delete(GrammarCorrection).where(GrammarCorrection.message_id.in_(owned_messages)))
+        db.execute(delete(Message).where(Message.conversation_id.in_(owned_conversation)))
+        deleted_id = db.execute(
+            delete(Conversation)
+            .where(Conversation.id == conversation_id, Conversation.user_id == user_id)
+            .returning(Conversation.id)
+        ).scalar_one_or_none()
+        
+        if deleted_id is None:
+            # Só no caso de erro é preciso saber se a conversa existe para responder 404 ou 403
+            exists_for_other_user = db.execute(
+                select(Conversation.id).where(Conversation.id == conversation_id)
+            ).first()
             
-            if existing_conversation:
+            if exists_for_other_user:
                 raise PermissionError("You don't have permission to delete this conversation")
             else:
                 raise ConversationNotFoundError(conversation_id)
         
-        db.delete(conversation)
         db.commit()
         
+        try:
+            clear_history(store, str(conversation_id))
+        except Exception as e:
+            logging.warning(f"Failed to clear cached history for conversation {conversation_id}: {e}")
+        
         logging.info(f"Successfully deleted conversation {conversation_id} for user {user_id}")
         
     except (ConversationNotFoundError, PermissionError):
@@ -1,6 +1,7 @@
 import logging
 import os
-from typing import Annotated
+import uuid
+from typing import Annotated, Callable
 
 import redis
 from dotenv import load_dotenv
@@ -8,17 +9,89 @@ from fastapi import Depends
 from langgraph.checkpoint.redis import RedisSaver
 from langgraph.store.base import BaseStore
 from langgraph.store.redis import RedisStore
-from sqlalchemy import create_engine
+from sqlalchemy import Column, DateTime, FetchedValue, create_engine, event, text
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
 from sqlalchemy.orm import Session, declarative_base, sessionmaker
 
 load_dotenv()
 
 # PostgreSQL Configuration
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./app.db")
-engine = create_engine(DATABASE_URL)
+
+# Pool sized for the request concurrency of one worker. pool_pre_ping replaces connections the
+# server dropped (idle timeouts, restarts) before handing them out instead of failing the request.
+# SQLite keeps SQLAlchemy's default pool, which doesn't take these options.
+if DATABASE_URL.startswith("sqlite"):
+    engine = create_engine(DATABASE_URL)
+else:
+    engine = create_engine(
+        DATABASE_URL,
+        pool_size=int(os.getenv("DB_POOL_SIZE", "25")),
+        max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "25")),
+        pool_timeout=int(os.getenv("DB_POOL_TIMEOUT", "10")),
+        pool_recycle=int(os.getenv("DB_POOL_RECYCLE", "1800")),
+        pool_pre_ping=True,
+    )
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+def uuid_primary_key() -> Column:
+    """
+    UUID primary key generated by the database.
+
+    On Postgres the id comes from gen_random_uuid() (built in since Postgres 13) and is read back
+    with RETURNING, with no Python call per row. Other dialects (the SQLite test database) have
+    no such function and get a Python uuid4 in _assign_uuid_primary_keys instead.
+    """
+    return Column(UUID(as_uuid=True), primary_key=True, server_default=FetchedValue(), info={"gen_random_uuid": True})
+
+@event.listens_for(Base.metadata, "after_create")
+def _install_uuid_defaults(metadata, connection, **kw):
+    # Also runs for tables that already existed, so tables created with the old Python-side
+    # default get the server default the next time create_all runs
+    if connection.dialect.name != "postgresql":
+        return
+    preparer = connection.dialect.identifier_preparer
+    for table in metadata.sorted_tables:
+        for column in table.primary_key.columns:
+            if column.info.get("gen_random_uuid"):
+                connection.execute(text(
+                    f"ALTER TABLE {preparer.format_table(table)} "
+                    f"ALTER COLUMN {preparer.format_column(column)} SET DEFAULT gen_random_uuid()"
+                ))
+
+class utcnow(FunctionElement):
+    """
+    Current time in UTC as a naive timestamp, generated by the database.
+
+    The timestamp columns are naive and the app writes datetime.utcnow() into them, so server-side
+    times must be UTC too. now() would return the session's time zone instead.
+    """
+    type = DateTime()
+    inherit_cache = True
+
+@compiles(utcnow, "postgresql")
+def _postgresql_utcnow(element, compiler, **kw):
+    return "TIMEZONE('utc', CURRENT_TIMESTAMP)"
+
+@compiles(utcnow)
+def _default_utcnow(element, compiler, **kw):
+    # CURRENT_TIMESTAMP is already UTC on SQLite
+    return "CURRENT_TIMESTAMP"
+
+@event.listens_for(Base, "before_insert", propagate=True)
+def _assign_uuid_primary_keys(mapper, connection, target):
+    if connection.dialect.name == "postgresql":
+        return
+    for column in mapper.primary_key:
+        if column.info.get("gen_random_uuid"):
+            key = mapper.get_property_by_column(column).key
+            if getattr(target, key) is None:
+                setattr(target, key, uuid.uuid4())
+
 def get_db():
     db = SessionLocal()
     try:
@@ -28,12 +101,35 @@ def get_db():
 
 DbSession = Annotated[Session, Depends(get_db)]
 
+def after_commit(db: Session, callback: Callable[[], None]) -> None:
+    """
+    Schedules `callback` to run once the session's pending work is committed by commit_session().
+
+    Used for side effects outside Postgres (Redis caches) that must not be visible if the
+    transaction never commits. The callbacks are dropped if the commit fails.
+    """
+    db.info.setdefault("after_commit", []).append(callback)
+
+def commit_session(db: Session) -> None:
+    """Commits the session and then runs its after_commit() callbacks. A failing callback is logged, not raised."""
+    callbacks = db.info.pop("after_commit", [])
+    db.commit()
+    for callback in callbacks:
+        try:
+            callback()
+        except Exception as e:
+            logging.warning(f"Post-commit callback failed: {e}", exc_info=True)
+
 # Redis and LangGraph Configuration
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "128"))
 
 # Standard Redis Client (for general purpose use)
+# The pool is created once per worker, bounded, and shared with the LangGraph checkpointer and
+# store. It stays binary (no decode_responses) because the store needs raw responses. When the
+# pool is exhausted, callers wait for a free connection instead of failing.
 try:
-    redis_pool = redis.ConnectionPool.from_url(REDIS_URL, decode_responses=True)
+    redis_pool = redis.BlockingConnectionPool.from_url(REDIS_URL, max_connections=REDIS_MAX_CONNECTIONS)
     redis_client_instance = redis.Redis(connection_pool=redis_pool)
     redis_client_instance.ping()
 except Exception as e:
@@ -50,9 +146,9 @@ RedisDep = Annotated[redis.Redis, Depends(get_redis_client)]
 
 # LangGraph Checkpointer (short-term conversation memory)
 try:
-    with RedisSaver.from_conn_string(REDIS_URL) as cp:
-        cp.setup()
-        checkpointer_instance = cp
+    # Built on the shared pool like the store; from_conn_string would open (and own) a pool of its own
+    checkpointer_instance = RedisSaver(redis_client=redis.Redis(connection_pool=redis_pool))
+    checkpointer_instance.setup()
 except Exception as e:
     logging.critical(f"Critical failure initializing LangGraph Checkpointer: {e}")
     checkpointer_instance = None
@@ -69,9 +165,9 @@ CheckpointerDep = Annotated[RedisSaver, Depends(get_checkpointer)]
 
 # LangGraph Store (long-term user memory)
 try:
-    with RedisStore.from_conn_string(REDIS_URL) as s:
-        s.setup()
-        store_instance = s
+    # Built directly on the shared pool; from_conn_string would open its own pool and close it on exit
+    store_instance = RedisStore(redis.Redis(connection_pool=redis_pool))
+    store_instance.setup()
 except Exception as e:
     logging.critical(f"Critical failure initializing LangGraph Store: {e}")
     store_instance = None
@@ -85,6 +181,13 @@ def get_store() -> BaseStore:
 StoreDep = Annotated[BaseStore, Depends(get_store)]
 
 
+def close_database_connections():
+    """Closes the shared Redis pool (client, checkpointer and store) and the database engine's pool."""
+    if redis_client_instance is not None:
+        redis_pool.disconnect()
+    engine.dispose()
+
+
 def verify_database_connections():
     """
     Confirms the status of database connections.
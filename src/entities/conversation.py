@@ -1,19 +1,22 @@
-from sqlalchemy import Column, String, DateTime, Text, ForeignKey
+from sqlalchemy import Column, String, DateTime, Text, ForeignKey, Index
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
-import uuid
-from datetime import datetime
-from ..database.core import Base
+from ..database.core import Base, utcnow, uuid_primary_key
 from .message import Message 
 
 class Conversation(Base):
     __tablename__ = 'conversations'
+    # A lista de conversas do usuário é ordenada pela mais recente
+    __table_args__ = (Index("ix_conversations_user_updated", "user_id", "updated_at"),)
     
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = uuid_primary_key()
     user_id = Column(UUID(as_uuid=True), ForeignKey('users.id'), nullable=False)
     title = Column(String(255), nullable=False)
-    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    # Horários gerados pelo banco, em UTC como o created_at das mensagens, sem callback Python no
+    # INSERT/UPDATE. O default=utcnow() vai inline no próprio INSERT, então também funciona em
+    # tabelas criadas antes do server_default
+    created_at = Column(DateTime, default=utcnow(), server_default=utcnow(), nullable=False)
+    updated_at = Column(DateTime, default=utcnow(), server_default=utcnow(), onupdate=utcnow(), nullable=False)
     
     user = relationship("User", back_populates="conversations")
     
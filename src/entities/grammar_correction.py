@@ -1,14 +1,13 @@
 from sqlalchemy import Column, String, ForeignKey, Text
 from sqlalchemy.dialects.postgresql import UUID
-from ..database.core import Base
+from ..database.core import Base, uuid_primary_key
 from sqlalchemy.orm import relationship
 
-import uuid
 from .message import Message
 
 class GrammarCorrection(Base):
     __tablename__ = 'grammar_corrections'
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = uuid_primary_key()
     
     # Correção agora pertence a uma mensagem específica.
     message_id = Column(UUID(as_uuid=True), ForeignKey('messages.id'), nullable=False, unique=True)
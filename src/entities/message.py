@@ -1,11 +1,10 @@
 from enum import Enum
 import enum
-import uuid
 from datetime import datetime
-from sqlalchemy import Column, String, DateTime, Text, ForeignKey, Enum as SQLAlchemyEnum 
+from sqlalchemy import Column, String, DateTime, Text, ForeignKey, Index, Enum as SQLAlchemyEnum
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
-from ..database.core import Base
+from ..database.core import Base, utcnow, uuid_primary_key
 
 class MessageRole(str, enum.Enum):
     HUMAN = "human"
@@ -13,15 +12,21 @@ class MessageRole(str, enum.Enum):
 
 class Message(Base):
     __tablename__ = 'messages'
+    # O histórico é sempre lido por conversa e em ordem cronológica: o índice composto evita o sort
+    __table_args__ = (Index("ix_messages_conv_created", "conversation_id", "created_at"),)
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = uuid_primary_key()
     conversation_id = Column(UUID(as_uuid=True), ForeignKey('conversations.id'), nullable=False)
     
     # 'human' para o usuário, 'ai' para o agente
     role = Column(SQLAlchemyEnum(MessageRole), nullable=False)
     content = Column(Text, nullable=False)
     
-    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    # Horário do Python, não do banco: as duas mensagens de um turno vão na mesma transação e
+    # o now() do Postgres daria a elas o mesmo horário, perdendo a ordem do histórico. O serviço
+    # de conversas fixa o horário ao criar cada mensagem; o default cobre os demais casos. O
+    # server_default, no mesmo relógio UTC, vale para inserts feitos fora do ORM.
+    created_at = Column(DateTime, default=datetime.utcnow, server_default=utcnow(), nullable=False)
 
     # Relacionamento de volta para a conversa
     conversation = relationship("Conversation", back_populates="messages")
@@ -1,15 +1,14 @@
 from sqlalchemy import Column, String, ARRAY
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
-import uuid
 from typing import List
-from ..database.core import Base
+from ..database.core import Base, uuid_primary_key
 
 
 class User(Base):
     __tablename__ = 'users'
     
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = uuid_primary_key()
     email = Column(String, unique=True, nullable=False)
     first_name = Column(String, nullable=False)
     last_name = Column(String, nullable=False)
@@ -1,15 +1,50 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from .database.core import Base, engine, verify_database_connections
+from .database.core import Base, close_database_connections, engine, verify_database_connections
 from .entities.user import User
 from .entities.conversation import Conversation
 from .api import register_routes
+from .audio.controller import preload_english_only_audio
+from .audio.service import close_client as close_transcription_client
+from .tts.service import close_http_client as close_tts_client
+from .agent.grammar_pipe import language_tool
 from .config_logging import configure_logging, LogLevels
+from .middleware import SelectiveGZipMiddleware
 
 configure_logging(LogLevels.info)
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    verify_database_connections()
+    # Sem migrações no projeto: as tabelas só são criadas quando AUTO_CREATE_TABLES=1
+    # (ex.: docker-compose), para não repetir a checagem de cada tabela em todo boot
+    if os.getenv("AUTO_CREATE_TABLES") == "1":
+        # Apaga as tabelas existentes
+        # Base.metadata.drop_all(bind=engine) 
+        Base.metadata.create_all(bind=engine)
+    # Sintetiza em segundo plano o áudio da resposta fixa para mensagens que não estão em inglês:
+    # o app não depende da API de TTS para subir, e até lá essa resposta é sintetizada na hora
+    preload_task = asyncio.create_task(preload_english_only_audio())
+    yield
+    preload_task.cancel()
+    # Espera o cancelamento terminar para a síntese não usar os clientes que serão fechados abaixo
+    await asyncio.gather(preload_task, return_exceptions=True)
+    # Fecha os pools de conexão HTTP compartilhados com as APIs externas
+    await close_transcription_client()
+    await close_tts_client()
+    await language_tool.aclose()
+    close_database_connections()
+
+# orjson serializa UUID e datetime nativamente e bem mais rápido que o json da stdlib
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
+# O CORSMiddleware do Starlette já é ASGI puro (só altera os headers em http.response.start).
+# Novos middlewares devem seguir o mesmo formato em vez de usar BaseHTTPMiddleware,
+# que cria Request/Response por requisição e passa o corpo por um canal de memória.
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -19,14 +54,9 @@ app.add_middleware(
     expose_headers=["*"],
 )
 
+# Comprime as respostas JSON maiores (histórico, perfil); o áudio já vem comprimido
+app.add_middleware(SelectiveGZipMiddleware, minimum_size=1024, compresslevel=5, exclude_prefixes=("/audio",))
 
 
-@app.on_event("startup")
-async def startup_db_client():
-    verify_database_connections()
-    # Apaga as tabelas existentes
-    # Base.metadata.drop_all(bind=engine) 
-    # Cria as tabelas automaticamente
-    Base.metadata.create_all(bind=engine)
 
 register_routes(app)
\ No newline at end of file
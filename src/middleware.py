@@ -0,0 +1,30 @@
+from typing import Tuple
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+
+class SelectiveGZipMiddleware:
+    """
+    GZip for the JSON endpoints only.
+
+    Requests whose path starts with one of `exclude_prefixes` skip compression entirely:
+    the audio endpoints answer with MP3, which is already compressed and is streamed
+    chunk by chunk to the client.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        compresslevel: int = 5,
+        exclude_prefixes: Tuple[str, ...] = (),
+    ) -> None:
+        self.app = app
+        self.gzip_app = GZipMiddleware(app, minimum_size=minimum_size, compresslevel=compresslevel)
+        self.exclude_prefixes = exclude_prefixes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and not scope["path"].startswith(self.exclude_prefixes):
+            await self.gzip_app(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
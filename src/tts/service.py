@@ -1,8 +1,17 @@
-import requests
+import asyncio
+import httpx
 import logging
-from typing import Optional
+import functools
+import hashlib
+import threading
+from typing import AsyncIterator, Literal, Optional, Tuple
+import orjson
+import redis
+from cachetools import LRUCache
 from decouple import config
 
+from src.database.core import redis_client_instance
+
 ELEVEN_LABS_API_KEY = config("ELEVEN_LABS_API_KEY")
 
 # Voice IDs for different characters
@@ -12,36 +21,124 @@ VOICE_IDS = {
     "antoni": "ErXwobaYiN019PkySvjV"    # Antoni voice
 }
 
-def convert_text_to_speech(
-    message: str, 
-    voice: str = "rachel",
+# Voice names accepted by the functions below; callers pass them already lowercase
+Voice = Literal["rachel", "shaun", "antoni"]
+
+# Everything in the request that doesn't depend on the message is built once
+_ENDPOINTS = {voice: f"https://api.elevenlabs.io/v1/text-to-speech/{voice_id}" for voice, voice_id in VOICE_IDS.items()}
+_HEADERS = {
+    "xi-api-key": ELEVEN_LABS_API_KEY,
+    "Content-Type": "application/json",
+    "accept": "audio/mpeg"
+}
+
+# Shared async HTTP client: keeps the TLS connections to ElevenLabs warm and never blocks the event loop.
+# Created on first use and dropped by close_http_client(), so every app lifespan gets an open client.
+_http_client: Optional[httpx.AsyncClient] = None
+
+def _get_http_client() -> httpx.AsyncClient:
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            timeout=30,
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=50)
+        )
+    return _http_client
+
+# Cache of generated audio: a small in-process LRU (bounded by total bytes) in front of Redis.
+# Only short messages are cached: stock phrases repeat, long answers almost never do.
+TTS_CACHE_TTL_SECONDS = 7 * 86400
+TTS_CACHE_MAX_CHARS = 200
+TTS_CACHE_MAX_BYTES = 512 * 1024
+_local_cache = LRUCache(maxsize=32 * 1024 * 1024, getsizeof=len)
+_local_cache_lock = threading.Lock()
+
+# Size of the audio chunks forwarded to the client when streaming
+STREAM_CHUNK_SIZE = 4096
+
+
+def _is_cacheable(message: str) -> bool:
+    return len(message) <= TTS_CACHE_MAX_CHARS
+
+def _tts_cache_key(message: str, voice: Voice, stability: float, similarity_boost: float) -> str:
+    raw = f"{voice}|{stability}|{similarity_boost}|{message}".encode()
+    return "tts:" + hashlib.blake2b(raw, digest_size=16).hexdigest()
+
+async def _cache_get(key: str) -> Optional[bytes]:
+    with _local_cache_lock:
+        audio = _local_cache.get(key)
+    if audio is not None:
+        return audio
+    
+    # The Redis client is synchronous, so its calls go to a worker thread
+    if redis_client_instance is not None:
+        try:
+            audio = await asyncio.to_thread(redis_client_instance.get, key)
+        except redis.RedisError as e:
+            logging.warning(f"TTS cache read failed: {e}")
+    if audio is not None:
+        with _local_cache_lock:
+            _local_cache[key] = audio
+    return audio
+
+async def _cache_set(key: str, audio: bytes) -> None:
+    if len(audio) > TTS_CACHE_MAX_BYTES:
+        return
+    with _local_cache_lock:
+        _local_cache[key] = audio
+    if redis_client_instance is not None:
+        try:
+            await asyncio.to_thread(redis_client_instance.set, key, audio, ex=TTS_CACHE_TTL_SECONDS)
+        except redis.RedisError as e:
+            logging.warning(f"TTS cache write failed: {e}")
+
+def _cached_tts(func):
+    """
+    Caches the audio returned by a TTS function, keyed on the message and voice settings.
+    
+    Failed conversions (None) and messages longer than TTS_CACHE_MAX_CHARS are not cached,
+    and Redis errors fall back to calling the API.
+    """
+    @functools.wraps(func)
+    async def wrapper(
+        message: str,
+        voice: Voice = "rachel",
+        stability: float = 0.5,
+        similarity_boost: float = 0.75
+    ) -> Optional[bytes]:
+        if not _is_cacheable(message):
+            return await func(message, voice, stability, similarity_boost)
+        
+        key = _tts_cache_key(message, voice, stability, similarity_boost)
+        
+        audio = await _cache_get(key)
+        if audio is None:
+            audio = await func(message, voice, stability, similarity_boost)
+            if audio is None:
+                return None
+            await _cache_set(key, audio)
+        return audio
+    
+    return wrapper
+
+async def get_cached_speech(
+    message: str,
+    voice: Voice = "rachel",
     stability: float = 0.5,
     similarity_boost: float = 0.75
 ) -> Optional[bytes]:
     """
-    Convert text to speech using ElevenLabs API.
-    
-    Args:
-        message: The text to convert to speech
-        voice: The voice to use (default: "rachel")
-        stability: Voice stability (0.0 to 1.0, default: 0.5)
-        similarity_boost: Voice similarity boost (0.0 to 1.0, default: 0.75)
+    Look up previously generated audio without calling the API.
     
     Returns:
-        Audio data as bytes if successful, None if failed
+        Audio data as bytes if cached, None otherwise
     """
-    if not ELEVEN_LABS_API_KEY:
-        logging.error("ElevenLabs API key not found in environment variables")
+    if not _is_cacheable(message):
         return None
-    
-    if not message.strip():
-        logging.error("Empty message provided for TTS conversion")
-        return None
-    
-    # Get voice ID
-    voice_id = VOICE_IDS.get(voice.lower(), VOICE_IDS["rachel"])
-    
-    # Request body
+    return await _cache_get(_tts_cache_key(message, voice, stability, similarity_boost))
+
+def _build_request(message: str, voice: Voice, stability: float, similarity_boost: float) -> Tuple[str, bytes]:
+    """Builds the (voice path, serialized JSON body) of an ElevenLabs text-to-speech request."""
     body = {
         "text": message,
         "voice_settings": {
@@ -49,35 +146,140 @@ def convert_text_to_speech(
             "similarity_boost": similarity_boost
         }
     }
+    return _ENDPOINTS[voice], orjson.dumps(body)
+
+class TextToSpeechError(Exception):
+    """Raised when ElevenLabs can't synthesize the message"""
+    pass
+
+async def stream_text_to_speech(
+    message: str,
+    voice: Voice = "rachel",
+    stability: float = 0.5,
+    similarity_boost: float = 0.75
+) -> AsyncIterator[bytes]:
+    """
+    Stream text to speech from the ElevenLabs streaming endpoint.
     
-    # Request headers
-    headers = {
-        "xi-api-key": ELEVEN_LABS_API_KEY,
-        "Content-Type": "application/json",
-        "accept": "audio/mpeg"
-    }
+    Args:
+        message: The text to convert to speech
+        voice: The voice to use (default: "rachel")
+        stability: Voice stability (0.0 to 1.0, default: 0.5)
+        similarity_boost: Voice similarity boost (0.0 to 1.0, default: 0.75)
     
-    # API endpoint
-    endpoint = f"https://api.elevenlabs.io/v1/text-to-speech/{voice_id}"
+    Yields:
+        Chunks of MPEG audio as they arrive
     
-    try:       
-        response = requests.post(endpoint, json=body, headers=headers, timeout=30)
-        
-        if response.status_code == 200:
-            return response.content
-        else:
-            logging.error(f"ElevenLabs API error: {response.status_code} - {response.text}")
-            return None
-            
-    except requests.exceptions.Timeout:
+    Raises:
+        TextToSpeechError: If the API key or message is missing or the API rejects the request
+        httpx.HTTPError: On timeouts and connection errors
+    """
+    if not ELEVEN_LABS_API_KEY:
+        raise TextToSpeechError("ElevenLabs API key not found in environment variables")
+    
+    if not message.strip():
+        raise TextToSpeechError("Empty message provided for TTS conversion")
+    
+    endpoint, content = _build_request(message, voice, stability, similarity_boost)
+    
+    async with _get_http_client().stream("POST", f"{endpoint}/stream", content=content, headers=_HEADERS) as response:
+        if response.status_code != 200:
+            await response.aread()
+            raise TextToSpeechError(f"ElevenLabs API error: {response.status_code} - {response.text}")
+        async for chunk in response.aiter_bytes(chunk_size=STREAM_CHUNK_SIZE):
+            yield chunk
+
+def _log_tts_error(e: Exception) -> None:
+    if isinstance(e, TextToSpeechError):
+        logging.error(str(e))
+    elif isinstance(e, httpx.TimeoutException):
         logging.error("ElevenLabs API timeout")
-        return None
-    except requests.exceptions.ConnectionError:
+    elif isinstance(e, httpx.TransportError):
         logging.error("ElevenLabs API connection error")
+    else:
+        logging.error(f"Unexpected error in text-to-speech conversion: {e}")
+
+@_cached_tts
+async def convert_text_to_speech(
+    message: str, 
+    voice: Voice = "rachel",
+    stability: float = 0.5,
+    similarity_boost: float = 0.75
+) -> Optional[bytes]:
+    """
+    Convert text to speech using ElevenLabs API, collecting the whole audio.
+    
+    Args:
+        message: The text to convert to speech
+        voice: The voice to use (default: "rachel")
+        stability: Voice stability (0.0 to 1.0, default: 0.5)
+        similarity_boost: Voice similarity boost (0.0 to 1.0, default: 0.75)
+    
+    Returns:
+        Audio data as bytes if successful, None if failed
+    """
+    try:
+        chunks = [chunk async for chunk in stream_text_to_speech(message, voice, stability, similarity_boost)]
+        return b"".join(chunks)
+    except Exception as e:
+        _log_tts_error(e)
         return None
+
+async def open_speech_stream(
+    message: str,
+    voice: Voice = "rachel",
+    stability: float = 0.5,
+    similarity_boost: float = 0.75
+) -> Optional[AsyncIterator[bytes]]:
+    """
+    Start streaming text to speech, waiting for the first chunk before returning.
+    
+    Waiting for the first chunk means a rejected request can still be reported to the
+    client; the rest of the audio is read while the iterator is consumed.
+    
+    Args:
+        message: The text to convert to speech
+        voice: The voice to use (default: "rachel")
+        stability: Voice stability (0.0 to 1.0, default: 0.5)
+        similarity_boost: Voice similarity boost (0.0 to 1.0, default: 0.75)
+    
+    Returns:
+        Async iterator over the audio chunks if the request was accepted, None if failed
+    """
+    audio_stream = stream_text_to_speech(message, voice, stability, similarity_boost)
+    try:
+        first_chunk = await anext(audio_stream)
+    except StopAsyncIteration:
+        first_chunk = b""
     except Exception as e:
-        logging.error(f"Unexpected error in text-to-speech conversion: {e}")
+        _log_tts_error(e)
         return None
+    
+    cache_key = _tts_cache_key(message, voice, stability, similarity_boost) if _is_cacheable(message) else None
+    
+    async def iter_audio() -> AsyncIterator[bytes]:
+        try:
+            chunks = [first_chunk]
+            yield first_chunk
+            async for chunk in audio_stream:
+                if cache_key is not None:
+                    chunks.append(chunk)
+                yield chunk
+            # Only a stream that was read to the end is complete enough to cache
+            if cache_key is not None:
+                await _cache_set(cache_key, b"".join(chunks))
+        finally:
+            # Releases the HTTP response (and its pooled connection) if the client stops reading early
+            await audio_stream.aclose()
+    
+    return iter_audio()
+
+async def close_http_client() -> None:
+    """Close the pooled connections to ElevenLabs. The next request creates a new client."""
+    global _http_client
+    if _http_client is not None:
+        closing, _http_client = _http_client, None
+        await closing.aclose()
 
 def get_available_voices() -> dict:
     """
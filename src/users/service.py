@@ -1,5 +1,7 @@
+from typing import Sequence
 from uuid import UUID
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, load_only
+from sqlalchemy.orm.interfaces import ORMOption
 from fastapi import HTTPException
 from . import models
 from src.entities.user import User
@@ -8,8 +10,14 @@ from src.auth.service import verify_password, get_password_hash
 import logging
 
 
-def get_user_by_id(db: Session, user_id: UUID) -> models.UserResponse:
-    user = db.query(User).filter(User.id == user_id).first()
+def get_user_by_id(db: Session, user_id: UUID, load_options: Sequence[ORMOption] = ()) -> models.UserResponse:
+    """
+    Get a user by ID.
+
+    `load_options` are applied to the query, e.g. load_only(...) to fetch just the columns a
+    caller needs, or selectinload(...) for relationships it is going to read.
+    """
+    user = db.query(User).options(*load_options).filter(User.id == user_id).first()
     if not user:
         logging.warning(f"User not found with ID: {user_id}")
         raise UserNotFoundError(user_id)
@@ -18,16 +26,16 @@ def get_user_by_id(db: Session, user_id: UUID) -> models.UserResponse:
 
 def get_user_by_name(db: Session, user_id: UUID) -> str:
     """Get a user's first name by ID"""
-    user = get_user_by_id(db, user_id)
+    user = get_user_by_id(db, user_id, [load_only(User.id, User.first_name)])
     return user.first_name
 
 def get_user_profile(db: Session, user_id: UUID) -> models.UserProfile:
-    user = get_user_by_id(db, user_id)
+    user = get_user_by_id(db, user_id, [load_only(User.id, User.first_name, User.user_interests)])
     
+    # User has no difficulties column, the field keeps its default
     return models.UserProfile(
         id=user.id,
         first_name=user.first_name,
-        user_difficulties=user.user_difficulties or [],
         user_interests=user.user_interests or []
     )
 
@@ -0,0 +1,49 @@
+from src.agent.language_tool import LanguageToolAPI
+
+
+def _match(offset, length, replacement=None, message="Possible error"):
+    return {
+        "message": message,
+        "shortMessage": "",
+        "offset": offset,
+        "length": length,
+        "rule": {"id": "TEST_RULE", "category": {"name": "Grammar"}},
+        "replacements": [{"value": replacement}] if replacement else [],
+        "context": {"text": ""},
+    }
+
+def test_parse_response_applies_all_replacements():
+    api = LanguageToolAPI()
+    text = "She dont like the apples wich I buyed"
+    result = {
+        "matches": [
+            _match(32, 5, "bought"),
+            _match(4, 4, "doesn't"),
+            _match(25, 4, "which"),
+        ]
+    }
+
+    correction = api._parse_response(text, result)
+
+    assert correction.corrected_text == "She doesn't like the apples which I bought"
+    assert [error.offset for error in correction.errors] == [4, 25, 32]
+    assert correction.explanation.startswith("Found 3 errors")
+
+def test_parse_response_keeps_text_without_replacements():
+    api = LanguageToolAPI()
+    text = "I very tired today"
+    result = {"matches": [_match(2, 4)]}
+
+    correction = api._parse_response(text, result)
+
+    assert correction.corrected_text == text
+    assert len(correction.errors) == 1
+
+def test_parse_response_no_matches():
+    api = LanguageToolAPI()
+
+    correction = api._parse_response("Hello there", {"matches": []})
+
+    assert correction.corrected_text == "Hello there"
+    assert correction.errors == []
+    assert correction.explanation == "No grammar errors found."
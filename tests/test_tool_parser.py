@@ -0,0 +1,45 @@
+import pytest
+from src.agent.tool_parser import parse_tool_call
+from src.agent.tool_schemas import SaveGrammarCorrection, UpdateUserProfile, WebSearch
+
+def test_parse_keyword_arguments():
+    tool_name, params = parse_tool_call('UpdateUserProfile(name="Ana", interests_to_add=["basketball", "music"])')
+
+    assert tool_name == "UpdateUserProfile"
+    assert isinstance(params, UpdateUserProfile)
+    assert params.name == "Ana"
+    assert params.location is None
+    assert params.interests_to_add == ["basketball", "music"]
+
+def test_parse_positional_arguments_and_backticks():
+    tool_name, params = parse_tool_call('`WebSearch("latest NBA scores")`')
+
+    assert tool_name == "WebSearch"
+    assert isinstance(params, WebSearch)
+    assert params.query == "latest NBA scores"
+
+def test_parse_multiline_call():
+    content = """SaveGrammarCorrection(
+        original_text="I has went",
+        corrected_text="I have gone",
+        explanation="Use 'have' with 'I'.",
+        improvement="I've already gone"
+    )"""
+
+    tool_name, params = parse_tool_call(content)
+
+    assert tool_name == "SaveGrammarCorrection"
+    assert isinstance(params, SaveGrammarCorrection)
+    assert params.corrected_text == "I have gone"
+
+def test_parse_unknown_tool():
+    with pytest.raises(ValueError):
+        parse_tool_call('DeleteEverything(confirm=True)')
+
+def test_parse_missing_required_field():
+    with pytest.raises(ValueError):
+        parse_tool_call('SaveGrammarCorrection(original_text="I has went")')
+
+def test_parse_non_literal_argument():
+    with pytest.raises(ValueError):
+        parse_tool_call('WebSearch(query=get_query())')